@@ -0,0 +1,217 @@
+"""Headless batch runner: plays many heists of one level across all CPU cores.
+
+Used to tune the DIFFICULTIES values without hand-playing, e.g.
+
+    python batch.py --level 3 --difficulty Hard --episodes 2000 --policy route
+    python batch.py --level 3 --difficulty Hard --vision 280 --detect 1.0
+"""
+
+import os, argparse, json, random, time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import LEVELS, DIFFICULTIES, TILE, FPS, Simulation, TickInput
+
+# -------------------- POLICIES --------------------
+
+class RandomPolicy:
+    """Holds a random WASD/shift combination for a random number of ticks."""
+
+    def __init__(self, rnd, crouch=False):
+        self.rnd = rnd
+        self.crouch = crouch
+        self.hold = 0
+        self.inp = TickInput()
+
+    def __call__(self, sim):
+        if self.hold <= 0:
+            r = self.rnd
+            self.inp = TickInput(up=r.random() < 0.3, down=r.random() < 0.3,
+                                 left=r.random() < 0.3, right=r.random() < 0.4,
+                                 crouch=self.crouch or r.random() < 0.2)
+            self.hold = r.randint(5, 40)
+        self.hold -= 1
+        return self.inp
+
+class RoutePolicy:
+    """Walks the shortest tile path to the nearest treasure / key, then the exit.
+
+    Starts after a random wait of up to two seconds so runs meet the guards
+    at different points of their patrols.
+    """
+
+    def __init__(self, rnd, crouch=False):
+        self.rnd = rnd
+        self.crouch = crouch
+        self.wait = rnd.randint(0, 2 * FPS)
+        self.path = []
+        self.plan_key = None
+
+    def targets(self, sim):
+        rects = sim.entities.rects("T") + sim.entities.rects("K")
+        if not rects:
+            rects = [sim.exit_rect] if sim.exit_rect else []
+        return {(r.centerx // TILE, r.centery // TILE): r.center for r in rects}
+
+    def plan(self, sim, start, goals):
+        grid = sim.grid
+        prev = {start: None}
+        queue = deque([start])
+        while queue:
+            cell = queue.popleft()
+            if cell in goals:
+                path = []
+                while cell is not None:
+                    path.append(cell)
+                    cell = prev[cell]
+                return path[::-1]
+            x, y = cell
+            for nxt in ((x + 1, y), (x - 1, y), (x, y + 1), (x, y - 1)):
+                if nxt not in prev and 0 <= nxt[0] < grid.cols and 0 <= nxt[1] < grid.rows \
+                        and not grid.blocked(*nxt):
+                    prev[nxt] = cell
+                    queue.append(nxt)
+        return []
+
+    def __call__(self, sim):
+        if self.wait > 0:
+            self.wait -= 1
+            return TickInput(crouch=self.crouch)
+        pos = sim.player.pos
+        cell = (int(pos.x // TILE), int(pos.y // TILE))
+        goals = self.targets(sim)
+        key = (cell, tuple(sorted(goals)), sim.has_key)
+        if key != self.plan_key:
+            self.plan_key = key
+            self.path = self.plan(sim, cell, goals)
+
+        if not self.path:
+            return TickInput(crouch=self.crouch)
+        if len(self.path) > 1:
+            nx, ny = self.path[1]
+            tx, ty = nx * TILE + TILE / 2, ny * TILE + TILE / 2
+        else:
+            tx, ty = goals[self.path[0]]
+        dx, dy = tx - pos.x, ty - pos.y
+        return TickInput(up=dy < -2, down=dy > 2, left=dx < -2, right=dx > 2, crouch=self.crouch)
+
+POLICIES = {"random": RandomPolicy, "route": RoutePolicy}
+
+# -------------------- EPISODES --------------------
+
+def run_episode(level_index, settings, policy_name, seed, crouch=False, max_ticks=None):
+    """Play one heist to the end; returns a small dict of outcome stats."""
+    sim = Simulation(LEVELS[level_index], settings)
+    policy = POLICIES[policy_name](random.Random(seed), crouch)
+    meter_sum = 0.0
+    peak = 0.0
+    while sim.result is None:
+        if max_ticks is not None and sim.ticks >= max_ticks:
+            break
+        sim.step(policy(sim))
+        meter_sum += sim.detect_meter
+        peak = max(peak, sim.detect_meter)
+    return {
+        "result": sim.result or "timeout",
+        "score": sim.gained,
+        "ticks": sim.ticks,
+        "mean_detect": meter_sum / max(1, sim.ticks),
+        "peak_detect": peak,
+    }
+
+def run_chunk(args):
+    level_index, settings, policy_name, seeds, crouch, max_ticks = args
+    return [run_episode(level_index, settings, policy_name, s, crouch, max_ticks) for s in seeds]
+
+def run_batch(level_index, settings, policy_name="random", episodes=1000, seed=0,
+              jobs=None, crouch=False, max_ticks=None):
+    """Spread `episodes` runs over a process pool; returns the per-episode dicts."""
+    jobs = jobs or os.cpu_count() or 1
+    seeds = [seed + i for i in range(episodes)]
+    chunk = max(1, min(64, episodes // (jobs * 4) or 1))
+    tasks = [(level_index, settings, policy_name, seeds[i:i + chunk], crouch, max_ticks)
+             for i in range(0, episodes, chunk)]
+    if jobs == 1:
+        return [ep for t in tasks for ep in run_chunk(t)]
+    with ProcessPoolExecutor(max_workers=jobs) as pool:
+        return [ep for eps in pool.map(run_chunk, tasks) for ep in eps]
+
+def percentile(values, q):
+    if not values:
+        return 0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(q / 100 * len(values)))]
+
+def summarize(episodes):
+    n = len(episodes)
+    counts = {"caught": 0, "escaped": 0, "timeout": 0}
+    for ep in episodes:
+        counts[ep["result"]] = counts.get(ep["result"], 0) + 1
+    scores = [ep["score"] for ep in episodes if ep["result"] == "escaped"]
+    return {
+        "episodes": n,
+        "rates": {k: v / n for k, v in counts.items()} if n else counts,
+        "score": {
+            "mean": sum(scores) / len(scores) if scores else 0,
+            "min": min(scores, default=0),
+            "p10": percentile(scores, 10),
+            "p50": percentile(scores, 50),
+            "p90": percentile(scores, 90),
+            "max": max(scores, default=0),
+        },
+        "mean_detect": sum(ep["mean_detect"] for ep in episodes) / n if n else 0,
+        "mean_peak_detect": sum(ep["peak_detect"] for ep in episodes) / n if n else 0,
+        "mean_seconds": sum(ep["ticks"] for ep in episodes) / n / FPS if n else 0,
+    }
+
+# -------------------- CLI --------------------
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--level", type=int, default=1, help=f"1..{len(LEVELS)}")
+    ap.add_argument("--difficulty", default="Medium", choices=list(DIFFICULTIES))
+    ap.add_argument("--episodes", type=int, default=500)
+    ap.add_argument("--policy", default="random", choices=list(POLICIES))
+    ap.add_argument("--crouch", action="store_true", help="policy always crouches")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--jobs", type=int, default=None, help="worker processes (default: all cores)")
+    ap.add_argument("--max-ticks", type=int, default=None)
+    ap.add_argument("--json", action="store_true", help="print the summary as JSON")
+    # difficulty overrides for tuning
+    ap.add_argument("--vision", type=float)
+    ap.add_argument("--detect", type=float)
+    ap.add_argument("--guard", type=float)
+    args = ap.parse_args()
+
+    settings = dict(DIFFICULTIES[args.difficulty])
+    for name in ("vision", "detect", "guard"):
+        if getattr(args, name) is not None:
+            settings[name] = getattr(args, name)
+
+    start = time.perf_counter()
+    episodes = run_batch(args.level - 1, settings, args.policy, args.episodes, args.seed,
+                         args.jobs, args.crouch, args.max_ticks)
+    elapsed = time.perf_counter() - start
+    summary = summarize(episodes)
+    summary["settings"] = settings
+    summary["wall_seconds"] = elapsed
+
+    if args.json:
+        print(json.dumps(summary, indent=2))
+        return
+
+    rates = summary["rates"]
+    score = summary["score"]
+    print(f"Level {args.level} | {args.difficulty} | policy={args.policy} | {summary['episodes']} episodes "
+          f"in {elapsed:.1f}s ({summary['episodes'] / elapsed:.0f}/s)")
+    print(f"  settings: vision={settings['vision']} detect={settings['detect']} guard={settings['guard']}")
+    print(f"  caught {rates['caught']:6.1%}   escaped {rates['escaped']:6.1%}   timeout {rates['timeout']:6.1%}")
+    print(f"  score  mean {score['mean']:.0f}  p10 {score['p10']}  p50 {score['p50']}  p90 {score['p90']}"
+          f"  max {score['max']}")
+    print(f"  detect meter  mean {summary['mean_detect']:.3f}  mean peak {summary['mean_peak_detect']:.3f}")
+    print(f"  mean episode length {summary['mean_seconds']:.1f}s")
+
+if __name__ == "__main__":
+    main()
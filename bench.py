@@ -0,0 +1,375 @@
+"""Benchmark suite for the game's hot paths, with regression checks.
+
+Runs headless (SDL dummy drivers), no window needed:
+
+    python bench.py                                  # run every scenario
+    python bench.py --save bench_baseline.json       # record a baseline
+    python bench.py --baseline bench_baseline.json   # exit 1 on a >15% slowdown
+    python bench.py --baseline bench_baseline.json --threshold 25 --filter sees
+    python bench.py --collision                      # linear scan vs SpatialHash table
+"""
+
+import os, sys, time, random, json, argparse, platform, tempfile
+
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+import pygame
+import main
+from main import (LEVELS, TILE, DT, DIFFICULTIES, line_of_sight,
+                  TileGrid, Player, GuardBatch, PATTERNS, ParticlePool, Simulation, TickInput,
+                  generate_vault)
+
+# -------------------- HELPERS --------------------
+
+def timeit(fn, min_time=0.2):
+    """Seconds per call of fn(), repeated until at least min_time has passed."""
+    calls = 0
+    start = time.perf_counter()
+    while True:
+        fn()
+        calls += 1
+        elapsed = time.perf_counter() - start
+        if elapsed >= min_time:
+            return elapsed / calls
+
+def measure(fn, ops=1, min_time=0.3):
+    """Time fn() call by call; each call performs `ops` operations.
+
+    Returns throughput plus per-operation latency percentiles (microseconds).
+    """
+    fn()  # warm caches / lazy allocations
+    samples = []
+    clock = time.perf_counter
+    start = clock()
+    while True:
+        t0 = clock()
+        fn()
+        t1 = clock()
+        samples.append(t1 - t0)
+        if t1 - start >= min_time and len(samples) >= 5:
+            break
+    samples.sort()
+    total = sum(samples)
+    per_op = 1e6 / ops
+    return {
+        "ops_per_sec": ops * len(samples) / total,
+        "mean_us": total / len(samples) * per_op,
+        "p50_us": samples[len(samples) // 2] * per_op,
+        "p99_us": samples[min(len(samples) - 1, int(0.99 * len(samples)))] * per_op,
+        "calls": len(samples),
+    }
+
+def big_map(cols, rows, seed=1):
+    """Synthetic open-plan vault: border walls plus random pillars (~20%),
+    with the player starting in the top-left corner."""
+    rnd = random.Random(seed)
+    rows_out = []
+    for y in range(rows):
+        row = []
+        for x in range(cols):
+            edge = x in (0, cols - 1) or y in (0, rows - 1)
+            row.append("#" if edge or rnd.random() < 0.2 else ".")
+        rows_out.append("".join(row))
+    rows_out[1] = "#P" + rows_out[1][2:]
+    return rows_out
+
+def floor_tiles(map_data):
+    return [(x, y) for y, row in enumerate(map_data) for x, ch in enumerate(row) if ch != "#"]
+
+def floor_points(map_data, count, seed):
+    """Random pixel positions on floor tiles."""
+    rnd = random.Random(seed)
+    free = floor_tiles(map_data)
+    points = []
+    for _ in range(count):
+        tx, ty = rnd.choice(free)
+        points.append((tx * TILE + rnd.uniform(4, TILE - 4), ty * TILE + rnd.uniform(4, TILE - 4)))
+    return points
+
+def player_rects(map_data, count=200, seed=2):
+    """Player-sized rects probing random floor tiles (what Player.move tests)."""
+    rects = []
+    for x, y in floor_points(map_data, count, seed):
+        r = pygame.Rect(0, 0, 22, 22)
+        r.center = (x, y)
+        rects.append(r)
+    return rects
+
+def wall_index(map_data):
+    """The wall index a Simulation moves its player against, with every
+    chunk loaded (the probes are spread over the whole map)."""
+    sim = Simulation(map_data, DIFFICULTIES["Easy"])
+    for cy in range(sim.level.chunk_rows):
+        for cx in range(sim.level.chunk_cols):
+            if (cx, cy) not in sim.loaded:
+                sim.load_chunk((cx, cy))
+    return sim.wall_index
+
+# -------------------- SCENARIOS --------------------
+# each returns (fn, ops per call)
+
+def scenario_line_of_sight(map_data, pairs=200):
+    grid = TileGrid(map_data)
+    starts = floor_points(map_data, pairs, seed=3)
+    ends = floor_points(map_data, pairs, seed=4)
+    segments = list(zip(starts, ends))
+
+    def run():
+        for a, b in segments:
+            line_of_sight(a, b, grid)
+    return run, len(segments)
+
+def scenario_player_move(map_data, players=200):
+    index = wall_index(map_data)
+    rnd = random.Random(5)
+    movers = [(Player(p), rnd.choice((-3, 0, 3)), rnd.choice((-3, 0, 3)))
+              for p in floor_points(map_data, players, seed=6)]
+
+    def run():
+        # players bump back and forth, so the walls they hit stay the same
+        for p, dx, dy in movers:
+            p.move(dx, dy, index, 0.0)
+            p.move(-dx, -dy, index, 0.0)
+    return run, 2 * len(movers)
+
+def scenario_sees(count, map_data=None):
+    """One frame of vision checks for `count` guards scattered around the
+    player (on the last campaign level by default)."""
+    if map_data is None:
+        map_data = LEVELS[-1]
+    grid = TileGrid(map_data)
+    settings = DIFFICULTIES["Hard"]
+    rnd = random.Random(7)
+    batch = GuardBatch()
+    for i, pos in enumerate(floor_points(map_data, count, seed=8)):
+        batch.add(pos, 220, settings["vision"], settings["guard"], PATTERNS[i % 3])
+        angle = rnd.uniform(0, 2 * np.pi)
+        batch.facing[i] = (np.cos(angle), np.sin(angle))
+    player = Player(floor_points(map_data, 1, seed=9)[0])
+
+    def run():
+        batch.sees(player, grid, False)
+    return run, 1
+
+def scenario_draw(game, level_index, dirty_rects=False, vault=None):
+    game.dirty_rects = dirty_rects
+    game.vault = vault
+    game.levels = [generate_vault(*vault)] if vault else LEVELS
+    game.level_index = level_index
+    game.load_level()
+
+    def run():
+        game.draw(False)
+    return run, 1
+
+def scenario_particles(game, count=10_000):
+    scenario_draw(game, 0)
+    game.particles = ParticlePool(capacity=count)
+    pool = game.particles
+    rnd = np.random.default_rng(10)
+    vels = rnd.uniform(-2, 2, (count, 2)).astype(np.float32)
+
+    def run():
+        # the pool is refilled whenever particles expire, so every call
+        # integrates (close to) `count` particles
+        if len(pool) < count:
+            pool.burst((main.WIDTH / 2, main.HEIGHT / 2), vels[len(pool):], (255, 255, 0), lifetime=1.0)
+        game.update_particles(DT)
+    return run, 1
+
+def scenario_sim_step(map_data, ticks=100):
+    """Simulation ticks on a (large) map; the player wanders between chunks."""
+    sim = Simulation(map_data, dict(DIFFICULTIES["Easy"], detect=1e9))
+    rnd = random.Random(11)
+    moves = [TickInput(up=rnd.random() < 0.5, down=rnd.random() < 0.5,
+                       left=rnd.random() < 0.5, right=rnd.random() < 0.5, crouch=True)
+             for _ in range(64)]
+    step = [0]
+
+    def run():
+        for _ in range(ticks):
+            step[0] += 1
+            sim.step(moves[step[0] // 90 % len(moves)])
+    return run, ticks
+
+def scenario_load_level(map_data):
+    """What Game.load_level() does on a level switch: a fresh Simulation."""
+    settings = DIFFICULTIES["Medium"]
+
+    def run():
+        Simulation(map_data, settings)
+    return run, 1
+
+def scenario_open_level(map_data):
+    """Open a level file whose compiled cache is already on disk (a level switch)."""
+    directory = tempfile.TemporaryDirectory(prefix="heist-bench-")
+    path = os.path.join(directory.name, "level.txt")
+    with open(path, "w") as f:
+        f.write("\n".join(map_data) + "\n")
+    cache_dir = os.path.join(directory.name, ".cache")
+    main.load_level_file(path, cache_dir)  # compile once
+
+    def run():
+        main.load_level_file(path, cache_dir)
+    run.directory = directory  # removed once the scenario is dropped
+    return run, 1
+
+def scenario_vec_step(level, envs=4096):
+    """One lockstep HeistVecEnv step; ops are env-steps."""
+    from vecenv import HeistVecEnv
+    env = HeistVecEnv(level, envs, "Easy")
+    actions = np.random.default_rng(5).integers(0, 1 << 5, (64, envs))
+    step = [0]
+
+    def run():
+        step[0] += 1
+        env.step(actions[step[0] // 20 % len(actions)])
+    return run, envs
+
+def scenarios():
+    """(name, factory) pairs; factories build their fixtures lazily."""
+    out = []
+    for i, level in enumerate(LEVELS):
+        out.append((f"line_of_sight/level{i + 1}", lambda l=level: scenario_line_of_sight(l)))
+    for i, level in enumerate(LEVELS):
+        out.append((f"player_move/level{i + 1}", lambda l=level: scenario_player_move(l)))
+    out.append(("player_move/synthetic100", lambda: scenario_player_move(big_map(100, 100))))
+    for n in (1, 10, 100):
+        out.append((f"sees_player/{n}_guards", lambda n=n: scenario_sees(n)))
+    for i in range(len(LEVELS)):
+        out.append((f"draw/level{i + 1}", lambda i=i: scenario_draw(get_game(), i)))
+    for i in range(len(LEVELS)):
+        out.append((f"draw_dirty/level{i + 1}", lambda i=i: scenario_draw(get_game(), i, True)))
+    out.append(("draw/vault512", lambda: scenario_draw(get_game(), 0, vault=(512, 512, 1))))
+    out.append(("update_particles/10k", lambda: scenario_particles(get_game())))
+    for i, level in enumerate(LEVELS):
+        out.append((f"load_level/level{i + 1}", lambda l=level: scenario_load_level(list(l))))
+    out.append(("open_level/level8", lambda: scenario_open_level(list(LEVELS[-1]))))
+    out.append(("open_level/vault2048", lambda: scenario_open_level(generate_vault(2048, 2048, seed=1))))
+    out.append(("sim_step/level8", lambda: scenario_sim_step(LEVELS[-1])))
+    for n in (64, 512, 2048):
+        out.append((f"sim_step/vault{n}", lambda n=n: scenario_sim_step(generate_vault(n, n, seed=1))))
+    out.append(("vec_step/level8x4096", lambda: scenario_vec_step(len(LEVELS))))
+    return out
+
+_game = None
+
+def get_game():
+    """One Game instance for all render scenarios (dummy video driver)."""
+    global _game
+    if _game is None:
+        _game = main.Game(history=None)
+        main.profiler.enabled = False
+    return _game
+
+# -------------------- BASELINES --------------------
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "machine": platform.machine(),
+        "pygame": pygame.version.ver,
+        "numpy": np.__version__,
+        "date": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+def compare(results, baseline, threshold):
+    """Names of scenarios whose throughput dropped more than `threshold` percent."""
+    regressions = []
+    for name, res in results.items():
+        base = baseline.get(name)
+        if not base:
+            continue
+        change = (res["ops_per_sec"] / base["ops_per_sec"] - 1) * 100
+        res["change_pct"] = change
+        if change < -threshold:
+            regressions.append(name)
+    return regressions
+
+# -------------------- COLLISION TABLE --------------------
+
+def bench_collision(name, map_data):
+    index = wall_index(map_data)
+    walls = list(index.rects.values())
+    rects = player_rects(map_data)
+
+    # Player.move does two collision tests per frame
+    def linear():
+        for r in rects:
+            any(r.colliderect(w) for w in walls)
+            any(r.colliderect(w) for w in walls)
+
+    def indexed():
+        for r in rects:
+            index.collides(r)
+            index.collides(r)
+
+    t_lin = timeit(linear) / len(rects)
+    t_idx = timeit(indexed) / len(rects)
+    print(f"{name:<22} walls={len(walls):>6}  linear={t_lin * 1e6:9.2f} us/frame"
+          f"  indexed={t_idx * 1e6:7.2f} us/frame  x{t_lin / t_idx:6.1f}")
+
+def collision_table():
+    print("Player.move collision (2 tests per frame)")
+    for i, level in enumerate(LEVELS):
+        bench_collision(f"Level {i + 1}", level)
+    bench_collision("Synthetic 100x100", big_map(100, 100))
+    bench_collision("Synthetic 250x250", big_map(250, 250))
+
+# -------------------- CLI --------------------
+
+def main_cli():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--filter", default="", help="only run scenarios whose name contains this")
+    ap.add_argument("--min-time", type=float, default=0.3, help="seconds spent per scenario")
+    ap.add_argument("--save", metavar="PATH", help="write results as a JSON baseline")
+    ap.add_argument("--baseline", metavar="PATH", help="compare against a saved baseline")
+    ap.add_argument("--threshold", type=float, default=15.0,
+                    help="max allowed ops/sec drop vs the baseline, in percent")
+    ap.add_argument("--collision", action="store_true",
+                    help="print the linear-scan vs SpatialHash collision table and exit")
+    args = ap.parse_args()
+
+    if args.collision:
+        collision_table()
+        return
+
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)["results"]
+
+    results = {}
+    for name, factory in scenarios():
+        if args.filter not in name:
+            continue
+        fn, ops = factory()
+        res = results[name] = measure(fn, ops, args.min_time)
+        line = (f"{name:<28} {res['ops_per_sec']:>12,.0f} ops/s  mean {res['mean_us']:9.2f} us"
+                f"  p50 {res['p50_us']:9.2f} us  p99 {res['p99_us']:9.2f} us")
+        if baseline and name in baseline:
+            change = (res["ops_per_sec"] / baseline[name]["ops_per_sec"] - 1) * 100
+            line += f"  {change:+6.1f}%"
+        print(line)
+
+    regressions = compare(results, baseline, args.threshold) if baseline else []
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump({"environment": environment(), "threshold_pct": args.threshold,
+                       "results": results}, f, indent=2)
+        print(f"saved {len(results)} results to {args.save}")
+
+    if regressions:
+        print(f"\n{len(regressions)} scenario(s) slower than the baseline by more than "
+              f"{args.threshold:g}%:")
+        for name in regressions:
+            print(f"  {name}: {results[name]['change_pct']:+.1f}%")
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main_cli()
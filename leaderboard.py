@@ -0,0 +1,55 @@
+"""Leaderboards from the run history (history.db), no window needed.
+
+    python leaderboard.py                              # campaign top 10 per difficulty
+    python leaderboard.py --level 03-doors-and-keys --difficulty Hard --top 20
+    python leaderboard.py --level 03-doors-and-keys --percentiles 50 90 99
+"""
+
+import os, sys, time, sqlite3, argparse
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import DIFFICULTIES, HISTORY_DB, RunHistory
+
+def when(played_at):
+    return time.strftime("%Y-%m-%d %H:%M", time.localtime(played_at))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--db", default=HISTORY_DB, help="history database")
+    ap.add_argument("--level", help="level name (file name without .txt, or vault-COLSxROWS-SEED); "
+                                    "default: whole campaigns")
+    ap.add_argument("--campaign", default="levels", help="campaign leaderboard to show without --level")
+    ap.add_argument("--difficulty", choices=list(DIFFICULTIES), help="default: every difficulty")
+    ap.add_argument("--top", type=int, default=10)
+    ap.add_argument("--percentiles", type=float, nargs="*", default=[50, 90, 99])
+    args = ap.parse_args()
+
+    try:
+        history = RunHistory.reader(args.db)
+    except sqlite3.Error:
+        sys.exit(f"no run history at {args.db}")
+    for diff in [args.difficulty] if args.difficulty else DIFFICULTIES:
+        start = time.perf_counter()
+        if args.level:
+            rows = history.top_levels(args.level, diff, args.top)
+            pct = [(q, history.level_percentile(args.level, diff, q)) for q in args.percentiles]
+        else:
+            rows = history.top_campaigns(diff, args.campaign, args.top)
+            pct = [(q, history.campaign_percentile(diff, q, args.campaign)) for q in args.percentiles]
+        elapsed = time.perf_counter() - start
+        if not rows:
+            continue
+        print(f"{args.level or args.campaign} – {diff}  ({elapsed * 1000:.1f} ms)")
+        for rank, row in enumerate(rows, 1):
+            if args.level:
+                score, used, peak, seed, played_at = row
+                print(f"  {rank:>3}. {score:>6}  {used:6.1f}s  peak {peak:.2f}  seed {seed}  {when(played_at)}")
+            else:
+                score, played_at = row
+                print(f"  {rank:>3}. {score:>6}  {when(played_at)}")
+        print("  " + "  ".join(f"p{q:g} {score}" for q, score in pct))
+    history.close()
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,13 @@
-import pygame, sys, math, time, random, os, json
+import time
+_import_start = time.perf_counter()
+
+import pygame, sys, math, random, os, json, heapq, struct, hashlib, argparse, mmap
+import sqlite3, threading, queue, atexit, pathlib
+import numpy as np
+from collections import deque, OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+
+_import_end = time.perf_counter()
 
 # -------------------- CONFIG / CONSTANTS --------------------
 
@@ -18,10 +27,29 @@ TEXT_COLOR = (230, 230, 230)
 KEY_COLOR = (255, 165, 0)
 DOOR_COLOR = (139, 69, 19)
 POWERUP_COLOR = (0, 255, 0)
+INVIS_COLOR = (170, 120, 255)
+
+# pickups by map char. Powerups set `effect` on the player until the
+# `until` attribute (set to now + `duration`) runs out
+PICKUPS = {
+    "T": {"color": TREASURE_COLOR},
+    "K": {"color": KEY_COLOR},
+    "S": {"color": POWERUP_COLOR, "effect": {"speed_boost": 1.8}, "until": "speed_end", "duration": 5},
+    "I": {"color": INVIS_COLOR, "effect": {"invisible": True}, "until": "invis_end", "duration": 4},
+}
+PICKUP_ORDER = {ch: i for i, ch in enumerate(PICKUPS)}  # same-tick pickups resolve in this order
 
 PLAYER_SPEED = 3
 CROUCH_SPEED = 1.4
 
+DT = 1 / FPS  # one simulation tick
+RENDER_FPS = 240  # render cap; logic always runs at FPS ticks per second
+MAX_CATCH_UP = 5  # most ticks simulated per rendered frame before dropping time
+
+CHUNK = 16  # level chunk side, in tiles
+ACTIVE_RADIUS = 1  # chunks kept loaded around the player's chunk
+PARK_INTERVAL = 30  # ticks between checks for guards that left the loaded area
+
 # Difficulty settings (vision range, detection time, guard speed, EMP availability, time limit multiplier)
 DIFFICULTIES = {
     "Easy":     {"vision": 220, "detect": 1.6, "guard": 1.7, "emp": True,  "time_mult": 1.5},
@@ -31,179 +59,1121 @@ DIFFICULTIES = {
     "Nightmare":{"vision": 360, "detect": 0.4, "guard": 3.5, "emp": False, "time_mult": 0.4},
 }
 
-# LEVELS: 8 levels with treasures, doors, keys, powerups
-LEVELS = [
-    # Level 1 – Simple
-    [
-        "########################",
-        "#P.....T..............E#",
-        "#.#####....######......#",
-        "#.....#....#....G......#",
-        "#.###.#....#######.###.#",
-        "#.....#............###.#",
-        "#.####.#######..G......#",
-        "#......................#",
-        "########################",
-    ],
-    # Level 2 – Walls and Guards
-    [
-        "########################",
-        "#P....T.....#.........E#",
-        "#.#####.....#..####..G.#",
-        "#.....#.....#..#....####",
-        "#.###.#.########.###...#",
-        "#...#.#........#...#...#",
-        "#.###.#....G..#.#.##...#",
-        "#......................#",
-        "########################",
-    ],
-    # Level 3 – Doors and Keys
-    [
-        "########################",
-        "#P....K.....#.........E#",
-        "#.#####.....D..####..G.#",
-        "#.....#.....#..#....####",
-        "#.###.#.########.###...#",
-        "#...#.#........#...#...#",
-        "#.###.#....G..#.#.##...#",
-        "#......................#",
-        "########################",
-    ],
-    # Level 4 – Multiple Treasures
-    [
-        "########################",
-        "#P....T.....T.........E#",
-        "#.#####.....#..####..G.#",
-        "#.....#.....#..#....####",
-        "#.###.#.########.###...#",
-        "#...#.#........#...#...#",
-        "#.###.#....G..#.#.##...#",
-        "#......................#",
-        "########################",
-    ],
-    # Level 5 – Complex Maze
-    [
-        "########################",
-        "#P..T.#.....#.........E#",
-        "#.####.#.....#..####..G#",
-        "#.....#.#....#..#....###",
-        "#.###.#.#.########.###.#",
-        "#...#.#.#........#...#.#",
-        "#.###.#.#....G..#.#.##.#",
-        "#.....#................#",
-        "########################",
-    ],
-    # Level 6 – Power-ups (speed)
-    [
-        "########################",
-        "#P....S.....#.........E#",
-        "#.#####.....#..####..G.#",
-        "#.....#.....#..#....####",
-        "#.###.#.########.###...#",
-        "#...#.#........#...#...#",
-        "#.###.#....G..#.#.##...#",
-        "#......................#",
-        "########################",
-    ],
-    # Level 7 – High Security (extra guard)
-    [
-        "########################",
-        "#P....T.....#.........E#",
-        "#.#####.....#..####..G.#",
-        "#.....#.....#..#....####",
-        "#.###.#.########.###...#",
-        "#...#.#........#...#...#",
-        "#.###.#....G..#.#.##...#",
-        "#.....G................#",
-        "########################",
-    ],
-    # Level 8 – Final Heist (doors, keys, speed)
-    [
-        "########################",
-        "#P..T.K.....D.........E#",
-        "#.####.#.....#..####..G#",
-        "#.....#.#....#..#....###",
-        "#.###.#.#.########.###.#",
-        "#...#.#.#........#...#.#",
-        "#.###.#.#....G..#.#.##.#",
-        "#.....#.....S..........#",
-        "########################",
-    ]
-]
+# campaign levels: one char map per file, played in file name order
+LEVEL_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "levels")
 
-# -------------------- MAP / LEVEL UTILS --------------------
+# -------------------- PROFILING --------------------
 
-def load_level(map_data):
-    walls = []
-    guards = []
-    player_pos = None
-    treasures = []
-    exit_rect = None
-    keys = []
-    doors = []
-    powerups = []
-
-    for y, row in enumerate(map_data):
-        for x, ch in enumerate(row):
-            wx, wy = x * TILE, y * TILE
-            tile_rect = pygame.Rect(wx, wy, TILE, TILE)
-
-            if ch == "#":
-                walls.append(tile_rect)
-            elif ch == "P":
-                player_pos = pygame.Vector2(tile_rect.center)
-            elif ch == "T":
-                treasures.append(pygame.Rect(wx + 8, wy + 8, 24, 24))
-            elif ch == "E":
-                exit_rect = pygame.Rect(wx + 8, wy + 8, 24, 24)
-            elif ch == "G":
-                guards.append(pygame.Vector2(tile_rect.center))
-            elif ch == "K":
-                keys.append(pygame.Rect(wx + 8, wy + 8, 24, 24))
-            elif ch == "D":
-                doors.append(pygame.Rect(wx, wy, TILE, TILE))
-            elif ch == "S":
-                powerups.append({"type": "speed", "rect": pygame.Rect(wx + 8, wy + 8, 24, 24)})
+class _Section:
+    __slots__ = ("prof", "name", "start")
 
-    return walls, player_pos, guards, treasures, exit_rect, keys, doors, powerups
+    def __init__(self, prof, name):
+        self.prof = prof
+        self.name = name
 
-def line_of_sight(start, end, walls):
-    """Raycast with wall blocking – used for sight and sound."""
-    steps = int(start.distance_to(end) / 6)
-    if steps <= 0:
-        return True
-    direction = (end - start) / steps
-    point = pygame.Vector2(start)
-    for _ in range(steps):
-        for w in walls:
-            if w.collidepoint(point.x, point.y):
-                return False
-        point += direction
-    return True
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
 
-# -------------------- PARTICLES --------------------
+    def __exit__(self, *exc):
+        end = time.perf_counter()
+        prof = self.prof
+        prof.sections[self.name] = prof.sections.get(self.name, 0.0) + (end - self.start)
+        prof.trace.append((self.name, self.start, end - self.start))
 
-class Particle:
-    def __init__(self, pos, vel, color, lifetime=0.5):
-        self.pos = pygame.Vector2(pos)
-        self.vel = pygame.Vector2(vel)
-        self.color = color
-        self.lifetime = lifetime
-        self.start_time = time.time()
+class _NoSection:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        pass
 
-    def update(self):
-        self.pos += self.vel
-        self.vel *= 0.95
+_NO_SECTION = _NoSection()
+
+class Profiler:
+    """Per-frame section timings and counters over a rolling window.
+
+    Disabled (the default, e.g. in headless runs) every call is a no-op.
+    Section names use dots for sub-passes ("draw.cones"). dump_csv() writes
+    one row per frame, dump_trace() a Chrome trace (chrome://tracing,
+    ui.perfetto.dev) of the most recent frames.
+    """
+
+    def __init__(self, window=300, trace_events=60000):
+        self.enabled = False
+        self.frames = deque(maxlen=window)  # (frame seconds, sections, counts)
+        self.trace = deque(maxlen=trace_events)  # (name, start, duration) / ("#frame", ...)
+        self.sections = {}
+        self.counts = {}
+
+    def section(self, name):
+        return _Section(self, name) if self.enabled else _NO_SECTION
+
+    def count(self, name, n=1):
+        if self.enabled:
+            self.counts[name] = self.counts.get(name, 0) + n
+
+    def end_frame(self, frame_time):
+        if not self.enabled:
+            return
+        self.frames.append((frame_time, self.sections, self.counts))
+        self.trace.append(("#frame", time.perf_counter(), dict(self.counts)))
+        self.sections = {}
+        self.counts = {}
+
+    @staticmethod
+    def percentile(values, q):
+        values = sorted(values)
+        return values[min(len(values) - 1, int(q / 100 * len(values)))] if values else 0.0
+
+    def summary(self):
+        """[(name, mean, p50, p99)] in ms for the frame and every section,
+        then [(counter, last, mean)] per frame."""
+        frames = list(self.frames)
+        if not frames:
+            return [], []
+        names = sorted({name for _, sections, _ in frames for name in sections})
+        rows = []
+        for name in ["frame"] + names:
+            if name == "frame":
+                values = [f[0] * 1000 for f in frames]
+            else:
+                values = [f[1].get(name, 0.0) * 1000 for f in frames]
+            rows.append((name, sum(values) / len(values),
+                         self.percentile(values, 50), self.percentile(values, 99)))
+        counters = sorted({name for _, _, counts in frames for name in counts})
+        counts = [(name, frames[-1][2].get(name, 0),
+                   sum(f[2].get(name, 0) for f in frames) / len(frames)) for name in counters]
+        return rows, counts
+
+    def dump_csv(self, path):
+        frames = list(self.frames)
+        sections = sorted({n for _, s, _ in frames for n in s})
+        counters = sorted({n for _, _, c in frames for n in c})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            f.write(",".join(["frame", "frame_ms"] + [s + "_ms" for s in sections] + counters) + "\n")
+            for i, (ft, secs, counts) in enumerate(frames):
+                row = [str(i), f"{ft * 1000:.3f}"]
+                row += [f"{secs.get(s, 0.0) * 1000:.3f}" for s in sections]
+                row += [str(counts.get(c, 0)) for c in counters]
+                f.write(",".join(row) + "\n")
+
+    def dump_trace(self, path):
+        events = []
+        for name, start, value in self.trace:
+            if name == "#frame":
+                events.append({"name": "counters", "ph": "C", "ts": start * 1e6, "pid": 1, "tid": 1,
+                               "args": value})
+            else:
+                events.append({"name": name, "cat": name.split(".")[0], "ph": "X",
+                               "ts": start * 1e6, "dur": value * 1e6, "pid": 1, "tid": 1})
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "w") as f:
+            json.dump({"traceEvents": events, "displayTimeUnit": "ms"}, f)
+
+profiler = Profiler()
+
+class StartupTimer:
+    """Wall-clock phases from the first import to the first presented frame.
+
+    mark(name) ends a phase. Background work (audio) marks when it finishes
+    and overlaps the foreground phases, so it is listed by completion time.
+    With `verbose` the report is printed at the first frame, and background
+    marks that land later are printed as they come in.
+    """
+
+    def __init__(self, start):
+        self.start = start
+        self.marks = []  # (name, time, background)
+        self.verbose = False
+        self.reported = False
+
+    def mark(self, name, background=False):
+        t = time.perf_counter()
+        self.marks.append((name, t, background))
+        if background and self.reported and self.verbose:
+            print(f"startup: {name} ready at {(t - self.start) * 1000:.1f} ms (background)")
+
+    def report(self):
+        lines = ["startup:"]
+        prev = self.start
+        for name, t, background in list(self.marks):
+            if background:
+                lines.append(f"  {name:<14} ready at {(t - self.start) * 1000:8.1f} ms (background)")
+            else:
+                lines.append(f"  {name:<14} {(t - prev) * 1000:8.1f} ms   at {(t - self.start) * 1000:8.1f} ms")
+                prev = t
+        return lines
 
-    def is_alive(self):
-        return (time.time() - self.start_time) < self.lifetime
+    def first_frame(self):
+        if self.reported:
+            return
+        self.mark("first frame")
+        self.reported = True
+        if self.verbose:
+            print("\n".join(self.report()))
 
-    def draw(self, screen):
-        t = (time.time() - self.start_time) / self.lifetime
-        alpha = max(0, int(255 * (1 - t)))
-        surf = pygame.Surface((4, 4), pygame.SRCALPHA)
-        pygame.draw.circle(surf, (*self.color, alpha), (2, 2), 2)
-        screen.blit(surf, (self.pos.x, self.pos.y))
+startup = StartupTimer(_import_start)
+startup.marks.append(("imports", _import_end, False))
+
+# -------------------- MAP / LEVEL UTILS --------------------
+
+def merge_tiles(tiles):
+    """Greedily merge a set of (x, y) tiles into maximal (x, y, w, h) rectangles.
+
+    Rows are scanned top-down; each rect takes the longest horizontal run from
+    its first free tile and then grows downwards while the whole run fits.
+    """
+    remaining = set(tiles)
+    rects = []
+    for x, y in sorted(remaining, key=lambda t: (t[1], t[0])):
+        if (x, y) not in remaining:
+            continue
+        w = 1
+        while (x + w, y) in remaining:
+            w += 1
+        h = 1
+        while all((x + i, y + h) in remaining for i in range(w)):
+            h += 1
+        for ty in range(y, y + h):
+            for tx in range(x, x + w):
+                remaining.discard((tx, ty))
+        rects.append((x, y, w, h))
+    return rects
+
+class ChunkedLevel:
+    """A char map cut into CHUNK×CHUNK tile blocks that are parsed on demand.
+
+    A chunk compiles to merged wall rects plus entity tiles; an LRU keeps the
+    parsed form of recently visited chunks, so the cost of a big vault is
+    only paid where the player goes.
+    """
+
+    def __init__(self, map_data, cache_size=64):
+        self.map_data = map_data
+        self.rows = len(map_data)
+        self.cols = max((len(row) for row in map_data), default=0)
+        self.chunk_cols = -(-self.cols // CHUNK)
+        self.chunk_rows = -(-self.rows // CHUNK)
+        # small maps sit inside the active window wherever the player stands
+        self.fits_window = max(self.chunk_cols, self.chunk_rows) <= ACTIVE_RADIUS + 1
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+        # guards are numbered in reading order
+        self.guards_before = []
+        total = 0
+        for row in map_data:
+            self.guards_before.append(total)
+            total += row.count("G")
+
+    def find(self, ch):
+        """Tile of the first `ch` in reading order, or None."""
+        for y, row in enumerate(self.map_data):
+            x = row.find(ch)
+            if x != -1:
+                return x, y
+        return None
+
+    def count(self, ch):
+        return sum(row.count(ch) for row in self.map_data)
+
+    def chunk_of(self, px, py):
+        """Chunk containing pixel (px, py), clamped to the map."""
+        size = CHUNK * TILE
+        return (min(max(int(px // size), 0), self.chunk_cols - 1),
+                min(max(int(py // size), 0), self.chunk_rows - 1))
+
+    def window(self, center):
+        """Chunks within ACTIVE_RADIUS of chunk `center`."""
+        cx, cy = center
+        r = ACTIVE_RADIUS
+        return {(x, y)
+                for y in range(max(0, cy - r), min(self.chunk_rows, cy + r + 1))
+                for x in range(max(0, cx - r), min(self.chunk_cols, cx + r + 1))}
+
+    def chunk(self, cx, cy):
+        """Parsed chunk: merged wall rects (pixels), entity tiles in reading
+        order, and the reading-order number of each guard (`ordinals`)."""
+        key = (cx, cy)
+        compiled = self.cache.get(key)
+        if compiled is not None:
+            self.cache.move_to_end(key)
+            return compiled
+        compiled = self.parse_chunk(cx, cy)
+        self.cache[key] = compiled
+        if len(self.cache) > self.cache_size:
+            self.cache.popitem(last=False)
+        return compiled
+
+    def parse_chunk(self, cx, cy):
+        x0, y0 = cx * CHUNK, cy * CHUNK
+        wall_tiles = []
+        entities = []
+        ordinals = {}
+        for y in range(y0, min(y0 + CHUNK, self.rows)):
+            row = self.map_data[y]
+            for i, ch in enumerate(row[x0:x0 + CHUNK]):
+                if ch == "#":
+                    wall_tiles.append((x0 + i, y))
+                elif ch != ".":
+                    entities.append((ch, x0 + i, y))
+                    if ch == "G":
+                        ordinals[(x0 + i, y)] = self.guards_before[y] + row.count("G", 0, x0 + i)
+
+        return {
+            "walls": [(x * TILE, y * TILE, w * TILE, h * TILE) for x, y, w, h in merge_tiles(wall_tiles)],
+            "entities": entities,
+            "ordinals": ordinals,
+        }
+
+_SOLID = bytes(1 if chr(c) in "#D" else 0 for c in range(256))
+
+class TileGrid:
+    """Occupancy bitmap of a level (one byte per tile, 1 = blocks sight/sound).
+
+    Doors are ordinary cells that can be toggled open or shut.
+    """
+
+    def __init__(self, map_data):
+        if isinstance(map_data, CompiledLevel):
+            self.rows, self.cols = map_data.rows, map_data.cols
+            self.cells = map_data.occupancy()
+            self.doors = map_data.tiles_of("D")
+            return
+        self.rows = len(map_data)
+        self.cols = max((len(row) for row in map_data), default=0)
+        self.cells = bytearray(self.cols * self.rows)
+        self.doors = []
+
+        # whole rows at a time: big generated vaults have millions of tiles
+        for y, row in enumerate(map_data):
+            start = y * self.cols
+            self.cells[start:start + len(row)] = row.encode().translate(_SOLID)
+            x = row.find("D")
+            while x != -1:
+                self.doors.append((x, y))
+                x = row.find("D", x + 1)
+
+    def blocked(self, tx, ty):
+        # outside the map nothing blocks – same as having no wall rect there
+        if 0 <= tx < self.cols and 0 <= ty < self.rows:
+            return self.cells[ty * self.cols + tx] == 1
+        return False
+
+    def set_cell(self, tx, ty, solid):
+        if 0 <= tx < self.cols and 0 <= ty < self.rows:
+            self.cells[ty * self.cols + tx] = 1 if solid else 0
+
+    def set_doors_open(self, is_open):
+        for tx, ty in self.doors:
+            self.set_cell(tx, ty, not is_open)
+
+class SpatialHash:
+    """Uniform grid index of static rects, bucketed by tile cell.
+
+    insert() hands back an int handle so single rects (doors) can be dropped
+    later without rebuilding the index.
+    """
+
+    def __init__(self, cell=TILE):
+        self.cell = cell
+        self.buckets = {}
+        self.rects = {}
+        self._next_handle = 0
+
+    def _cells(self, rect):
+        c = self.cell
+        for cy in range(rect.top // c, (rect.bottom - 1) // c + 1):
+            for cx in range(rect.left // c, (rect.right - 1) // c + 1):
+                yield cx, cy
+
+    def insert(self, rect):
+        handle = self._next_handle
+        self._next_handle += 1
+        self.rects[handle] = rect
+        for key in self._cells(rect):
+            self.buckets.setdefault(key, []).append(handle)
+        return handle
+
+    def remove(self, handle):
+        rect = self.rects.pop(handle, None)
+        if rect is None:
+            return
+        for key in self._cells(rect):
+            bucket = self.buckets.get(key)
+            if bucket and handle in bucket:
+                bucket.remove(handle)
+
+    def query(self, rect):
+        """Handles of all rects overlapping `rect` (each at most once)."""
+        found = set()
+        for key in self._cells(rect):
+            for handle in self.buckets.get(key, ()):
+                if handle not in found and self.rects[handle].colliderect(rect):
+                    found.add(handle)
+        return found
+
+    def collides(self, rect):
+        for key in self._cells(rect):
+            for handle in self.buckets.get(key, ()):
+                if self.rects[handle].colliderect(rect):
+                    return True
+        return False
+
+class EntityStore:
+    """Pickups and doors of the loaded chunks as struct-of-arrays slots.
+
+    add() returns an int handle (slot plus a generation), so remove() is O(1)
+    and a handle kept after its entity is gone simply reads as dead. Every
+    entity is bucketed by tile; touching() only looks at the player's cells.
+    `blocker` holds the wall-index handle of a shut door.
+    """
+
+    SLOT_BITS = 24
+
+    def __init__(self, cell=TILE):
+        self.cell = cell
+        self.kind = []     # map char, None for a free slot
+        self.rect = []
+        self.tile = []
+        self.blocker = []
+        self.gen = []
+        self.free = []
+        self.buckets = {}  # cell -> set of handles
+        self.counts = dict.fromkeys(PICKUPS, 0)
+        self.counts["D"] = 0
+
+    def _cells(self, rect):
+        c = self.cell
+        for cy in range(rect.top // c, (rect.bottom - 1) // c + 1):
+            for cx in range(rect.left // c, (rect.right - 1) // c + 1):
+                yield cx, cy
+
+    def add(self, kind, rect, tile, blocker=None):
+        if self.free:
+            slot = self.free.pop()
+            self.gen[slot] += 1
+            self.kind[slot], self.rect[slot], self.tile[slot], self.blocker[slot] = kind, rect, tile, blocker
+        else:
+            slot = len(self.kind)
+            self.kind.append(kind)
+            self.rect.append(rect)
+            self.tile.append(tile)
+            self.blocker.append(blocker)
+            self.gen.append(0)
+        handle = self.gen[slot] << self.SLOT_BITS | slot
+        for key in self._cells(rect):
+            self.buckets.setdefault(key, set()).add(handle)
+        self.counts[kind] += 1
+        return handle
+
+    def slot(self, handle):
+        """Slot of a live handle, else None."""
+        slot = handle & ((1 << self.SLOT_BITS) - 1)
+        if self.kind[slot] is None or self.gen[slot] != handle >> self.SLOT_BITS:
+            return None
+        return slot
+
+    def remove(self, handle):
+        slot = self.slot(handle)
+        if slot is None:
+            return
+        for key in self._cells(self.rect[slot]):
+            self.buckets[key].discard(handle)
+        self.counts[self.kind[slot]] -= 1
+        self.kind[slot] = self.rect[slot] = self.tile[slot] = self.blocker[slot] = None
+        self.free.append(slot)
+
+    def query(self, rect):
+        """Live handles whose rect overlaps `rect`, in slot order."""
+        found = set()
+        for key in self._cells(rect):
+            for handle in self.buckets.get(key, ()):
+                if self.rect[self.slot(handle)].colliderect(rect):
+                    found.add(handle)
+        return sorted(found, key=self.slot)
+
+    def touching(self, rect):
+        """(slot, handle) of the pickups overlapping `rect`, in PICKUP_ORDER.
+
+        Runs every tick for the player, so the usual empty answer costs only
+        the bucket lookups of its few cells.
+        """
+        c = self.cell
+        buckets = self.buckets
+        hits = None
+        for cy in range(rect.top // c, (rect.bottom - 1) // c + 1):
+            for cx in range(rect.left // c, (rect.right - 1) // c + 1):
+                bucket = buckets.get((cx, cy))
+                if bucket:
+                    hits = (hits or set()) | bucket
+        if not hits:
+            return []
+        hits = [(self.slot(h), h) for h in hits]
+        hits = [(slot, h) for slot, h in hits if self.kind[slot] in PICKUPS and self.rect[slot].colliderect(rect)]
+        return sorted(hits, key=lambda sh: (PICKUP_ORDER[self.kind[sh[0]]], sh[0]))
+
+    def count(self, kinds):
+        return sum(self.counts[k] for k in kinds)
+
+    def rects(self, kinds):
+        return [r for k, r in zip(self.kind, self.rect) if k is not None and k in kinds]
+
+def bfs_distances(grid, start, limit):
+    """Tile steps from `start` to every open tile within `limit` steps
+    (4-neighbour flood fill). Returns {cell index: steps}."""
+    cols, rows = grid.cols, grid.rows
+    sx, sy = start
+    if not (0 <= sx < cols and 0 <= sy < rows) or grid.blocked(sx, sy):
+        return {}
+    cells = grid.cells
+    dist = {sy * cols + sx: 0}
+    frontier = [sy * cols + sx]
+    for d in range(1, limit + 1):
+        nxt = []
+        for i in frontier:
+            x = i % cols
+            for j in (i - 1 if x > 0 else -1, i + 1 if x < cols - 1 else -1, i - cols, i + cols):
+                if 0 <= j < len(cells) and not cells[j] and j not in dist:
+                    dist[j] = d
+                    nxt.append(j)
+        if not nxt:
+            break
+        frontier = nxt
+    return dist
+
+class NavGrid:
+    """Tile navigation for chasing guards, built once per level.
+
+    Holds flow fields (BFS distance to a target tile) that all chasers share;
+    a field is only recomputed when the target moves to another tile.
+    """
+
+    RADIUS = 48  # tiles – guards further away than this just head straight
+
+    def __init__(self, grid):
+        self.grid = grid
+        self.fields = {}
+
+    def invalidate(self):
+        """Drop cached fields (call when doors open or close)."""
+        self.fields.clear()
+
+    def field(self, target):
+        f = self.fields.get(target)
+        if f is None:
+            if len(self.fields) > 8:
+                self.fields.clear()
+            f = self.fields[target] = bfs_distances(self.grid, target, self.RADIUS)
+        return f
+
+    def next_waypoint(self, pos, goal):
+        """Point to steer towards when heading from `pos` to `goal`."""
+        cols = self.grid.cols
+        gx, gy = int(goal[0] // TILE), int(goal[1] // TILE)
+        cx, cy = int(pos[0] // TILE), int(pos[1] // TILE)
+        if (cx, cy) == (gx, gy) or not (0 <= cx < cols):
+            return goal
+        field = self.field((gx, gy))
+        here = field.get(cy * cols + cx)
+        if here is None:
+            return goal  # off the nav grid (e.g. patrolled into a wall)
+        for nx, ny in ((cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)):
+            if 0 <= nx < cols and field.get(ny * cols + nx) == here - 1:
+                return pygame.Vector2(nx * TILE + TILE / 2, ny * TILE + TILE / 2)
+        return goal
+
+class SoundMap:
+    """Noise propagation through the tile grid.
+
+    For a source tile, a small Dijkstra flood fill (8 neighbours, no squeezing
+    between diagonal walls) gives the walking distance in pixels to every tile
+    within `max_radius`, so sound bends around corners and fades with path
+    length. Fields are cached per source tile (LRU) and dropped when doors
+    open; a footstep then costs one array lookup per guard.
+
+    Path lengths run between tile centres, up to about a tile off the real
+    positions. So each field also marks the tiles in sight of the source
+    tile (centre to centre); guards standing on them hear by the exact
+    straight-line distance, as before sound went around corners, and only
+    guards behind walls by path length.
+    """
+
+    def __init__(self, grid, max_radius=160, cache_size=256):
+        self.grid = grid
+        self.reach = int(math.ceil(max_radius / TILE))
+        self.max_radius = max_radius
+        self.cache_size = cache_size
+        self.fields = OrderedDict()
+
+    def invalidate(self):
+        self.fields.clear()
+
+    def field(self, src):
+        """(2R+1)² array of path lengths around tile `src` (inf = unreachable)."""
+        return self.entry(src)[0]
+
+    def sight(self, src):
+        """(2R+1)² bool array: tiles in line of sight of tile `src`."""
+        return self.entry(src)[1]
+
+    def entry(self, src):
+        """(path lengths, in sight) around tile `src`, from the cache."""
+        e = self.fields.get(src)
+        if e is not None:
+            self.fields.move_to_end(src)
+            return e
+
+        r = self.reach
+        size = 2 * r + 1
+        f = np.full((size, size), np.inf, np.float32)
+        seen = np.zeros((size, size), bool)
+        sx, sy = src
+        grid = self.grid
+        if grid.blocked(sx, sy):
+            self.fields[src] = f, seen
+            return f, seen
+
+        def open_(lx, ly):
+            return 0 <= lx < size and 0 <= ly < size and not grid.blocked(sx - r + lx, sy - r + ly)
+
+        f[r, r] = 0.0
+        heap = [(0.0, r, r)]
+        diag = TILE * math.sqrt(2)
+        while heap:
+            d, lx, ly = heapq.heappop(heap)
+            if d > f[ly, lx]:
+                continue
+            for ox, oy in ((1, 0), (-1, 0), (0, 1), (0, -1), (1, 1), (1, -1), (-1, 1), (-1, -1)):
+                nx, ny = lx + ox, ly + oy
+                if not open_(nx, ny):
+                    continue
+                if ox and oy:
+                    if not (open_(lx + ox, ly) and open_(lx, ly + oy)):
+                        continue
+                    nd = d + diag
+                else:
+                    nd = d + TILE
+                if nd < f[ny, nx] and nd <= self.max_radius + diag:
+                    f[ny, nx] = nd
+                    heapq.heappush(heap, (nd, nx, ny))
+
+        # in sight: one raycast per reachable tile, paid once per source tile
+        centre = (sx * TILE + TILE / 2, sy * TILE + TILE / 2)
+        for ly, lx in zip(*np.nonzero(np.isfinite(f))):
+            tile = ((sx - r + lx) * TILE + TILE / 2, (sy - r + ly) * TILE + TILE / 2)
+            seen[ly, lx] = line_of_sight(centre, tile, grid)
+
+        self.fields[src] = f, seen
+        if len(self.fields) > self.cache_size:
+            self.fields.popitem(last=False)
+        return f, seen
+
+    def distances(self, source_pos, positions):
+        """How far sound travels from `source_pos` to each of `positions`
+        ((n, 2) array): the straight line to positions on tiles in sight,
+        else the path length."""
+        src = (int(source_pos[0] // TILE), int(source_pos[1] // TILE))
+        f, seen = self.entry(src)
+        r = self.reach
+        local = (positions // TILE).astype(np.int64) - (src[0] - r, src[1] - r)
+        size = 2 * r + 1
+        inside = ((local >= 0) & (local < size)).all(axis=1)
+        lx, ly = local[inside, 0], local[inside, 1]
+        d = positions[inside] - (source_pos[0], source_pos[1])
+        straight = np.sqrt(d[:, 0] * d[:, 0] + d[:, 1] * d[:, 1])
+        out = np.full(len(positions), np.inf)
+        out[inside] = np.where(seen[ly, lx], straight, f[ly, lx])
+        return out
+
+def ray_hit(start, end, grid):
+    """Fraction (0..1) along start→end where the segment first enters a
+    blocking tile, or None if it reaches `end` unobstructed.
+
+    Exact grid traversal (Amanatides–Woo): visits every tile the segment
+    crosses once, so the cost is O(tiles crossed) and thin wall corners
+    can't be skipped over like with fixed-step sampling.
+    """
+    if profiler.enabled:  # hot path: skip even the call while profiling is off
+        profiler.count("raycasts")
+    x0, y0 = start
+    x1, y1 = end
+    tx, ty = int(x0 // TILE), int(y0 // TILE)
+    if grid.blocked(tx, ty):
+        return 0.0
+
+    dx, dy = x1 - x0, y1 - y0
+    step_x = 1 if dx > 0 else -1
+    step_y = 1 if dy > 0 else -1
+
+    # ray parameter t (0..1) at the next vertical / horizontal tile boundary
+    if dx != 0:
+        edge_x = (tx + 1) * TILE if dx > 0 else tx * TILE
+        t_max_x = (edge_x - x0) / dx
+        t_delta_x = TILE / abs(dx)
+    else:
+        t_max_x = t_delta_x = math.inf
+    if dy != 0:
+        edge_y = (ty + 1) * TILE if dy > 0 else ty * TILE
+        t_max_y = (edge_y - y0) / dy
+        t_delta_y = TILE / abs(dy)
+    else:
+        t_max_y = t_delta_y = math.inf
+
+    while True:
+        if t_max_x < t_max_y:
+            t = t_max_x
+            if t > 1:
+                return None
+            tx += step_x
+            t_max_x += t_delta_x
+        elif t_max_y < t_max_x:
+            t = t_max_y
+            if t > 1:
+                return None
+            ty += step_y
+            t_max_y += t_delta_y
+        else:
+            t = t_max_x
+            if t > 1:
+                return None
+            # passing exactly through a corner: no peeking between diagonal walls
+            if grid.blocked(tx + step_x, ty) or grid.blocked(tx, ty + step_y):
+                return t
+            tx += step_x
+            ty += step_y
+            t_max_x += t_delta_x
+            t_max_y += t_delta_y
+
+        if grid.blocked(tx, ty):
+            return t
+
+def line_of_sight(start, end, grid):
+    """Raycast with wall blocking – used for sight and sound."""
+    return ray_hit(start, end, grid) is None
+
+# -------------------- LEVEL FILES --------------------
+
+LEVEL_MAGIC = b"HLVL"
+LEVEL_VERSION = 1
+# magic, version, sha1 of the source text, cols, rows, chunk size, wall rects, entities
+_LEVEL_HEADER = struct.Struct("<4sB20sIIHII")
+_RECT = np.dtype([("x", "<u2"), ("y", "<u2"), ("w", "<u2"), ("h", "<u2")])  # tiles
+_ENTITY = np.dtype([("kind", "u1"), ("x", "<u2"), ("y", "<u2")])
+
+def _pad4(out):
+    out += bytes(-len(out) % 4)
+
+def build_level_file(map_data):
+    """Compile a char map into the binary level format (bytes).
+
+    Layout after the header, each section padded to 4 bytes: the occupancy
+    bitmap (1 bit per tile, reading order), per-chunk start offsets into the
+    wall rect and entity tables (u32, one more than there are chunks), the
+    merged wall rects of every chunk (u16 tiles) and the entities of every
+    chunk in reading order (kind, x, y).
+    """
+    level = ChunkedLevel(map_data, cache_size=0)
+    if max(level.cols, level.rows) > 0xFFFF:
+        raise ValueError("levels are limited to 65535 tiles per side")
+    grid = TileGrid(map_data)
+    rects, entities = [], []
+    rect_start, entity_start = [0], [0]
+    for cy in range(level.chunk_rows):
+        for cx in range(level.chunk_cols):
+            chunk = level.parse_chunk(cx, cy)
+            rects += [(x // TILE, y // TILE, w // TILE, h // TILE) for x, y, w, h in chunk["walls"]]
+            entities += [(ord(ch), x, y) for ch, x, y in chunk["entities"]]
+            rect_start.append(len(rects))
+            entity_start.append(len(entities))
+
+    digest = hashlib.sha1("\n".join(map_data).encode()).digest()
+    out = bytearray(_LEVEL_HEADER.pack(LEVEL_MAGIC, LEVEL_VERSION, digest, level.cols, level.rows,
+                                       CHUNK, len(rects), len(entities)))
+    _pad4(out)
+    out += np.packbits(np.frombuffer(bytes(grid.cells), np.uint8)).tobytes()
+    _pad4(out)
+    out += np.array(rect_start, "<u4").tobytes()
+    out += np.array(entity_start, "<u4").tobytes()
+    out += np.array(rects, _RECT).tobytes()
+    _pad4(out)
+    out += np.array(entities, _ENTITY).tobytes()
+    return bytes(out)
+
+class CompiledLevel(ChunkedLevel):
+    """A level in the binary format, read in place from a (memory-mapped) buffer.
+
+    Every section is a NumPy view on the buffer, so opening a level only
+    parses the header; the OS pages tiles and chunk tables in as chunks are
+    loaded. Indexing and iterating give the char map rows, so tools written
+    for plain char maps keep working.
+    """
+
+    def __init__(self, buf, cache_size=64):
+        if len(buf) < _LEVEL_HEADER.size:
+            raise ValueError("not a compiled heist level")
+        magic, version, digest, cols, rows, chunk, n_rects, n_entities = _LEVEL_HEADER.unpack_from(buf)
+        if magic != LEVEL_MAGIC:
+            raise ValueError("not a compiled heist level")
+        if version != LEVEL_VERSION or chunk != CHUNK:
+            raise ValueError(f"compiled level is version {version} with {chunk}-tile chunks")
+        self.buf = buf
+        self.source_hash = digest.hex()
+        self.rows, self.cols = rows, cols
+        self.chunk_cols = -(-cols // CHUNK)
+        self.chunk_rows = -(-rows // CHUNK)
+        self.fits_window = max(self.chunk_cols, self.chunk_rows) <= ACTIVE_RADIUS + 1
+        self.cache_size = cache_size
+        self.cache = OrderedDict()
+
+        chunks = self.chunk_cols * self.chunk_rows
+        pos = -(-_LEVEL_HEADER.size // 4) * 4
+        bitmap_size = -(-cols * rows // 8)
+        self.bitmap = np.frombuffer(buf, np.uint8, bitmap_size, pos)
+        pos += -(-bitmap_size // 4) * 4
+        self.rect_start = np.frombuffer(buf, "<u4", chunks + 1, pos)
+        pos += 4 * (chunks + 1)
+        self.entity_start = np.frombuffer(buf, "<u4", chunks + 1, pos)
+        pos += 4 * (chunks + 1)
+        self.rects = np.frombuffer(buf, _RECT, n_rects, pos)
+        pos += -(-n_rects * _RECT.itemsize // 4) * 4
+        self.entities = np.frombuffer(buf, _ENTITY, n_entities, pos)
+        self._guard_keys = None
+
+    # ----------------- WHOLE-LEVEL QUERIES -----------------
+
+    def occupancy(self):
+        """One byte per tile (1 = solid), as TileGrid stores it."""
+        return bytearray(np.unpackbits(self.bitmap, count=self.cols * self.rows))
+
+    def _reading_order(self, kind):
+        e = self.entities[self.entities["kind"] == ord(kind)]
+        return e[np.lexsort((e["x"], e["y"]))]
+
+    def tiles_of(self, kind):
+        e = self._reading_order(kind)
+        return list(zip(e["x"].tolist(), e["y"].tolist()))
+
+    def find(self, ch):
+        tiles = self.tiles_of(ch)
+        return tiles[0] if tiles else None
+
+    def count(self, ch):
+        return int(np.count_nonzero(self.entities["kind"] == ord(ch)))
+
+    # ----------------- CHUNKS -----------------
+
+    def parse_chunk(self, cx, cy):
+        i = cy * self.chunk_cols + cx
+        r = self.rects[self.rect_start[i]:self.rect_start[i + 1]]
+        e = self.entities[self.entity_start[i]:self.entity_start[i + 1]]
+        walls = list(zip((r["x"].astype(int) * TILE).tolist(), (r["y"].astype(int) * TILE).tolist(),
+                         (r["w"].astype(int) * TILE).tolist(), (r["h"].astype(int) * TILE).tolist()))
+        entities = [(chr(k), x, y) for k, x, y in zip(e["kind"].tolist(), e["x"].tolist(), e["y"].tolist())]
+        ordinals = {}
+        guards = [(x, y) for ch, x, y in entities if ch == "G"]
+        if guards:
+            if self._guard_keys is None:
+                g = self._reading_order("G")
+                self._guard_keys = g["y"].astype(np.int64) * self.cols + g["x"]
+            keys = np.array([y * self.cols + x for x, y in guards], np.int64)
+            ordinals = dict(zip(guards, np.searchsorted(self._guard_keys, keys).tolist()))
+        return {"walls": walls, "entities": entities, "ordinals": ordinals}
+
+    # ----------------- CHAR MAP VIEW -----------------
+
+    def __len__(self):
+        return self.rows
+
+    def __getitem__(self, y):
+        y = range(self.rows)[y]
+        start = y * self.cols
+        bits = np.unpackbits(self.bitmap[start // 8:-(-(start + self.cols) // 8)])
+        bits = bits[start % 8:start % 8 + self.cols]
+        row = bytearray(np.where(bits, ord("#"), ord(".")).astype(np.uint8).tobytes())
+        e = self.entities[self.entities["y"] == y]
+        for k, x in zip(e["kind"].tolist(), e["x"].tolist()):
+            row[x] = k
+        return row.decode()
+
+    def __iter__(self):
+        return (self[y] for y in range(self.rows))
+
+def load_level_file(path, cache_dir):
+    """Open a char-map level file through the binary cache.
+
+    The compiled file is keyed by name and checked against the SHA-1 of the
+    source text, so editing a level recompiles it on its next load. It is
+    memory-mapped; when the cache can't be written the level is compiled in
+    memory instead.
+    """
+    with open(path, "rb") as f:
+        text = f.read()
+    text = text[:-1] if text.endswith(b"\n") else text
+    if b"\r" in text:
+        text = "\n".join(text.decode().splitlines()).encode()
+    digest = hashlib.sha1(text).digest()  # == map_hash() of the rows
+    cached = os.path.join(cache_dir, os.path.splitext(os.path.basename(path))[0] + ".hlvl")
+
+    buf = None
+    try:
+        with open(cached, "rb") as f:
+            buf = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        level = CompiledLevel(buf)
+        if level.source_hash == digest.hex():
+            return level
+        del level  # its section views pin the map
+    except (OSError, ValueError):
+        pass
+    if buf is not None:
+        buf.close()  # Windows can't replace a file that is still mapped
+
+    data = build_level_file(text.decode().split("\n"))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp = f"{cached}.{os.getpid()}.tmp"
+        with open(tmp, "wb") as f:
+            f.write(data)
+        os.replace(tmp, cached)
+        with open(cached, "rb") as f:
+            return CompiledLevel(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+    except OSError:
+        return CompiledLevel(data)
+
+class LevelLibrary:
+    """The campaign: every *.txt char map in a directory, in name order.
+
+    Only the directory listing happens up front; a level is opened (from
+    its compiled cache) the first time it is indexed and kept open after.
+    """
+
+    def __init__(self, directory, cache_dir=None):
+        self.directory = directory
+        self.cache_dir = cache_dir or os.path.join(directory, ".cache")
+        try:
+            self.names = sorted(n for n in os.listdir(directory) if n.endswith(".txt"))
+        except OSError:
+            self.names = []
+        self.levels = {}
+
+    def __len__(self):
+        return len(self.names)
+
+    def __getitem__(self, i):
+        i = range(len(self.names))[i]
+        level = self.levels.get(i)
+        if level is None:
+            level = self.levels[i] = load_level_file(os.path.join(self.directory, self.names[i]),
+                                                      self.cache_dir)
+        return level
+
+    def __iter__(self):
+        return (self[i] for i in range(len(self.names)))
+
+LEVELS = LevelLibrary(LEVEL_DIR)
+
+# -------------------- PROCEDURAL VAULTS --------------------
+
+VAULT_ROOM = 10  # room pitch in tiles (9 open tiles + one shared wall)
+
+def generate_vault(cols=500, rows=500, seed=0, treasures=8, guard_rate=0.35,
+                   door_rate=0.15, loop_rate=0.1, powerup_rate=0.04):
+    """Seeded random vault as a char map in the same format as LEVELS.
+
+    Rooms on a grid are joined by a random spanning tree plus a few extra
+    openings (alternate routes). Some openings are doors: the key is placed
+    where the player can reach it with every door shut, treasures and the
+    exit anywhere, since every room connects once the doors are open.
+    """
+    rnd = random.Random(seed)
+    R = VAULT_ROOM
+    nx, ny = (cols - 1) // R, (rows - 1) // R
+    if nx * ny < 2:
+        raise ValueError(f"vault of {cols}x{rows} tiles has room for fewer than two rooms")
+
+    # rows of rooms: open interiors with a pillar at local (3, 3) (7, 3) (3, 7) (7, 7)
+    pad = "#" * (cols - nx * R)
+    open_row = ("#" + "." * (R - 1)) * nx + pad
+    pillar_row = ("#" + "..#...#..") * nx + pad
+    wall_row = "#" * cols
+    room_rows = [open_row if ly not in (3, 7) else pillar_row for ly in range(1, R)]
+    tiles = [bytearray(wall_row.encode())]
+    for _ in range(ny):
+        tiles += [bytearray(r.encode()) for r in room_rows]
+        tiles.append(bytearray(wall_row.encode()))
+    while len(tiles) < rows:
+        tiles.append(bytearray(wall_row.encode()))
+
+    # spanning tree over rooms (randomized Kruskal) + a few loops
+    parent = list(range(nx * ny))
+
+    def root(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    edges = [(i, i + 1) for i in range(nx * ny) if i % nx < nx - 1]
+    edges += [(i, i + nx) for i in range(nx * (ny - 1))]
+    rnd.shuffle(edges)
+    links = []
+    for a, b in edges:
+        ra, rb = root(a), root(b)
+        if ra != rb:
+            parent[ra] = rb
+            links.append((a, b))
+        elif rnd.random() < loop_rate:
+            links.append((a, b))
+
+    neighbours = [[] for _ in range(nx * ny)]  # (room, through a door?)
+    for a, b in links:
+        door = rnd.random() < door_rate
+        ax, ay = a % nx, a // nx
+        k = rnd.randint(1, R - 1)
+        if b == a + 1:   # opening in the wall column between a and its right neighbour
+            x, y = (ax + 1) * R, ay * R + k
+        else:            # opening in the wall row below a
+            x, y = ax * R + k, (ay + 1) * R
+        tiles[y][x] = ord("D" if door else ".")
+        neighbours[a].append((b, door))
+        neighbours[b].append((a, door))
+
+    def reachable(start, through_doors):
+        depth = {start: 0}
+        queue = deque([start])
+        while queue:
+            room = queue.popleft()
+            for nxt, door in neighbours[room]:
+                if nxt not in depth and (through_doors or not door):
+                    depth[nxt] = depth[room] + 1
+                    queue.append(nxt)
+        return depth
+
+    def put(room, lx, ly, ch):
+        tiles[(room // nx) * R + ly][(room % nx) * R + lx] = ord(ch)
+
+    start = rnd.randrange(nx * ny)
+    put(start, 5, 5, "P")
+    depth = reachable(start, True)
+    exit_room = max(depth, key=lambda r: (depth[r], -r))
+    put(exit_room, 2, 2, "E")
+
+    others = [r for r in range(nx * ny) if r != start]
+    for room in rnd.sample(others, min(treasures, len(others))):
+        put(room, 2, 8, "T")
+    if any(door for links_ in neighbours for _, door in links_):
+        before_doors = sorted(reachable(start, False))
+        put(rnd.choice(before_doors), 8, 2, "K")
+    for room in others:
+        if rnd.random() < guard_rate:
+            put(room, 5, 5, "G")
+        if rnd.random() < powerup_rate:
+            put(room, 8, 8, "S")
+
+    return [row.decode() for row in tiles]
+
+# -------------------- PARTICLES --------------------
+
+class ParticlePool:
+    """Fixed-capacity particle system kept in contiguous NumPy arrays.
+
+    Integration is vectorized, dead particles are swap-removed with live ones
+    from the tail, and sprites come from a cache keyed by (colour, alpha step),
+    so nothing is allocated per particle.
+    """
+
+    ALPHA_STEPS = 16
+
+    def __init__(self, capacity=8192):
+        self.capacity = capacity
+        self.count = 0
+        self.pos = np.zeros((capacity, 2), np.float32)
+        self.vel = np.zeros((capacity, 2), np.float32)
+        self.color = np.zeros((capacity, 3), np.uint8)
+        self.age = np.zeros(capacity, np.float32)
+        self.lifetime = np.ones(capacity, np.float32)
+        self._sprites = {}
+
+    def __len__(self):
+        return self.count
+
+    def clear(self):
+        self.count = 0
+
+    def emit(self, pos, vel, color, lifetime=0.5):
+        """Spawn one particle; silently dropped when the pool is full."""
+        i = self.count
+        if i >= self.capacity:
+            return
+        self.pos[i] = pos
+        self.vel[i] = vel
+        self.color[i] = color
+        self.age[i] = 0.0
+        self.lifetime[i] = lifetime
+        self.count = i + 1
+
+    def burst(self, pos, vels, color, lifetime=0.5):
+        """Spawn len(vels) particles at one point (vels is an (n, 2) array)."""
+        n = min(len(vels), self.capacity - self.count)
+        if n <= 0:
+            return
+        s = slice(self.count, self.count + n)
+        self.pos[s] = pos
+        self.vel[s] = vels[:n]
+        self.color[s] = color
+        self.age[s] = 0.0
+        self.lifetime[s] = lifetime
+        self.count += n
+
+    def update(self, dt):
+        n = self.count
+        if n == 0:
+            return
+        self.pos[:n] += self.vel[:n]
+        self.vel[:n] *= 0.95
+        self.age[:n] += dt
+
+        alive = self.age[:n] < self.lifetime[:n]
+        k = int(np.count_nonzero(alive))
+        if k < n:
+            # holes below the new count are filled by survivors above it
+            holes = np.flatnonzero(~alive[:k])
+            movers = np.flatnonzero(alive[k:]) + k
+            for arr in (self.pos, self.vel, self.color, self.age, self.lifetime):
+                arr[holes] = arr[movers]
+            self.count = k
+
+    def sprite(self, color, step):
+        key = (color, step)
+        surf = self._sprites.get(key)
+        if surf is None:
+            alpha = 255 * step // (self.ALPHA_STEPS - 1)
+            surf = pygame.Surface((4, 4), pygame.SRCALPHA)
+            profiler.count("surfaces")
+            pygame.draw.circle(surf, (*color, alpha), (2, 2), 2)
+            self._sprites[key] = surf
+        return surf
+
+    def draw(self, screen, offset=(0, 0)):
+        """Blit all live particles shifted by `offset` (world → screen);
+        returns the bounding rect on screen (None if empty)."""
+        n = self.count
+        if n == 0:
+            return None
+        fade = np.clip(1 - self.age[:n] / self.lifetime[:n], 0, 1)
+        steps = (fade * (self.ALPHA_STEPS - 1)).astype(np.int32).tolist()
+        colors = [tuple(c) for c in self.color[:n].tolist()]
+        pos = self.pos[:n] + np.asarray(offset, np.float32)
+        sprite = self.sprite
+        screen.blits([(sprite(c, a), p) for c, a, p in zip(colors, steps, pos.tolist())],
+                     doreturn=False)
+        lo = pos.min(axis=0)
+        hi = pos.max(axis=0)
+        area = pygame.Rect(int(lo[0]), int(lo[1]), int(hi[0] - lo[0]) + 5, int(hi[1] - lo[1]) + 5)
+        return area.clip(screen.get_rect())
 
 # -------------------- PLAYER --------------------
 
@@ -225,11 +1195,11 @@ class Player:
     def update_rect(self):
         self.rect.center = (self.pos.x, self.pos.y)
 
-    def move(self, dx, dy, walls):
-        # apply speed boost duration
-        if time.time() > self.speed_end:
+    def move(self, dx, dy, walls, now):
+        # apply speed boost duration (now = simulation clock in seconds)
+        if now > self.speed_end:
             self.speed_boost = 1.0
-        if time.time() > self.invis_end:
+        if now > self.invis_end:
             self.invisible = False
 
         target_vel = pygame.Vector2(dx, dy) * self.speed_boost
@@ -237,12 +1207,12 @@ class Player:
 
         temp = self.rect.copy()
         temp.centerx += self.vel.x
-        if not any(temp.colliderect(w) for w in walls):
+        if not walls.collides(temp):
             self.pos.x += self.vel.x
 
         temp = self.rect.copy()
         temp.centery += self.vel.y
-        if not any(temp.colliderect(w) for w in walls):
+        if not walls.collides(temp):
             self.pos.y += self.vel.y
 
         self.update_rect()
@@ -255,9 +1225,10 @@ class Player:
         else:
             self.anim_frame = 0
 
-    def draw(self, screen):
+    def draw(self, screen, pos=None):
+        """`pos` overrides the drawn centre (interpolated render position)."""
         # invisibility hides player (for guards), but still render faint outline for user?
-        if self.invisible and time.time() < self.invis_end:
+        if self.invisible:
             alpha = 80
         else:
             alpha = 255
@@ -265,6 +1236,7 @@ class Player:
         col = (255, 50, 160) if self.crouch else PLAYER_COLOR
 
         base_surf = pygame.Surface((self.rect.width + 10, self.rect.height + 10), pygame.SRCALPHA)
+        profiler.count("surfaces")
         pygame.draw.rect(base_surf, (100, 0, 70, alpha), base_surf.get_rect(), border_radius=8)
         pygame.draw.rect(base_surf, (*col, alpha), base_surf.get_rect().inflate(-8, -8), border_radius=6)
 
@@ -275,257 +1247,1289 @@ class Player:
         pygame.draw.line(base_surf, (*col, alpha), (cx - 4, by), (cx - 4 + leg_offset, by + 5), 2)
         pygame.draw.line(base_surf, (*col, alpha), (cx + 4, by), (cx + 4 - leg_offset, by + 5), 2)
 
-        screen.blit(base_surf, base_surf.get_rect(center=self.rect.center))
+        center = self.rect.center if pos is None else (round(pos[0]), round(pos[1]))
+        return screen.blit(base_surf, base_surf.get_rect(center=center))
 
 # -------------------- GUARD --------------------
 
-class Guard:
-    def __init__(self, pos, patrol_range, vision_range, speed, pattern="horizontal"):
-        self.pos = pygame.Vector2(pos)
-        self.speed = speed
-        self.vision = vision_range
-        self.pattern = pattern
-        self.rect = pygame.Rect(0, 0, 24, 24)
-        self.alert = False
-        self.alert_timer = 0
-        self.chase_target = None
-        self.facing = pygame.Vector2(1, 0)
+_cone_cache = {}
 
-        # define patrol bounds
-        if self.pattern == "horizontal":
-            self.start_x = self.pos.x - patrol_range / 2
-            self.end_x = self.pos.x + patrol_range / 2
-            self.start_y = self.end_y = self.pos.y
-            self.vel = pygame.Vector2(self.speed, 0)
-        elif self.pattern == "vertical":
-            self.start_y = self.pos.y - patrol_range / 2
-            self.end_y = self.pos.y + patrol_range / 2
-            self.start_x = self.end_x = self.pos.x
-            self.vel = pygame.Vector2(0, self.speed)
-        else:  # box pattern
-            self.start_x = self.pos.x - patrol_range / 2
-            self.end_x = self.pos.x + patrol_range / 2
-            self.start_y = self.pos.y - patrol_range / 2
-            self.end_y = self.pos.y + patrol_range / 2
-            self.vel = pygame.Vector2(self.speed, 0)
+def cone_offsets(heading, vision):
+    """Ray end offsets of a vision cone (40 rays over 80°), cached per
+    (heading in whole degrees, vision range)."""
+    key = (heading, vision)
+    offsets = _cone_cache.get(key)
+    if offsets is None:
+        base_angle = math.radians(heading) - math.radians(80) / 2
+        offsets = []
+        for i in range(40):
+            ang = base_angle + (math.radians(80) * i / 40)
+            offsets.append((math.cos(ang) * vision, math.sin(ang) * vision))
+        _cone_cache[key] = offsets
+    return offsets
+
+PATTERNS = ("horizontal", "vertical", "box")
+COS_HALF_FOV = math.cos(math.radians(80) / 2)
+VECTOR_MIN = 24  # below this many guards NumPy's per-call overhead loses to plain Python
+
+# Where a patrolling guard turns, per pattern index, checked in order after
+# it has moved (first match wins): (axis, at the end of its range?, heading
+# needed along that axis (0: any), new (vx, vy) in units of its speed
+# (None: keep), new facing). Both patrol paths read this one table.
+PATROL_TURNS = {
+    0: ((0, False, 0, (1, None), (1, 0)),
+        (0, True, 0, (-1, None), (-1, 0))),
+    1: ((1, False, 0, (None, 1), (0, 1)),
+        (1, True, 0, (None, -1), (0, -1))),
+    2: ((0, True, 1, (0, 1), (0, 1)),     # right edge: go down
+        (1, True, 1, (-1, 0), (-1, 0)),   # bottom: go left
+        (0, False, -1, (0, -1), (0, -1)), # left edge: go up
+        (1, False, -1, (1, 0), (1, 0))),  # top: go right
+}
 
-        self.update_rect()
+def in_cone(vx, vy, fx, fy, vision):
+    """Is the player offset (vx, vy) within `vision` and the 80° cone around
+    facing (fx, fy)? Works on floats and on NumPy arrays alike."""
+    d2 = vx * vx + vy * vy
+    dot = fx * vx + fy * vy
+    # angle <= 40° without acos/sqrt: dot >= 0 and dot² >= cos²(40°)·|vec|²
+    return (d2 > 0) & (d2 <= vision * vision) & (dot >= 0) & (dot * dot >= COS_HALF_FOV ** 2 * d2)
 
-    def update_rect(self):
-        self.rect.center = (self.pos.x, self.pos.y)
+class GuardBatch:
+    """All guards of a level as NumPy arrays (one row per guard).
 
-    def update(self, player_pos=None):
-        if self.alert and player_pos is not None:
-            # chase player
-            diff = player_pos - self.pos
-            if diff.length_squared() > 1:
-                direction = diff.normalize()
-                self.vel = direction * (self.speed * 1.6)
-                self.facing = direction
-            self.pos += self.vel
-            self.alert_timer -= 1 / FPS
-            if self.alert_timer <= 0:
-                self.alert = False
-        else:
-            # patrol patterns
-            if self.pattern == "horizontal":
-                self.pos += self.vel
-                if self.pos.x <= self.start_x:
-                    self.pos.x = self.start_x
-                    self.vel.x = self.speed
-                    self.facing = pygame.Vector2(1, 0)
-                elif self.pos.x >= self.end_x:
-                    self.pos.x = self.end_x
-                    self.vel.x = -self.speed
-                    self.facing = pygame.Vector2(-1, 0)
-            elif self.pattern == "vertical":
-                self.pos += self.vel
-                if self.pos.y <= self.start_y:
-                    self.pos.y = self.start_y
-                    self.vel.y = self.speed
-                    self.facing = pygame.Vector2(0, 1)
-                elif self.pos.y >= self.end_y:
-                    self.pos.y = self.end_y
-                    self.vel.y = -self.speed
-                    self.facing = pygame.Vector2(0, -1)
-            else:  # box
-                self.pos += self.vel
-                if self.vel.x > 0 and self.pos.x >= self.end_x:
-                    self.pos.x = self.end_x
-                    self.vel = pygame.Vector2(0, self.speed)
-                    self.facing = pygame.Vector2(0, 1)
-                elif self.vel.y > 0 and self.pos.y >= self.end_y:
-                    self.pos.y = self.end_y
-                    self.vel = pygame.Vector2(-self.speed, 0)
-                    self.facing = pygame.Vector2(-1, 0)
-                elif self.vel.x < 0 and self.pos.x <= self.start_x:
-                    self.pos.x = self.start_x
-                    self.vel = pygame.Vector2(0, -self.speed)
-                    self.facing = pygame.Vector2(0, -1)
-                elif self.vel.y < 0 and self.pos.y <= self.start_y:
-                    self.pos.y = self.start_y
-                    self.vel = pygame.Vector2(self.speed, 0)
-                    self.facing = pygame.Vector2(1, 0)
+    Patrol movement and the cheap range / cone tests run for every guard at
+    once; only guards that pass them pay for a wall raycast, and only
+    chasing guards are stepped one by one. `Guard` objects are views on a row.
 
-        self.update_rect()
+    Every guard moves before any of them looks (update(), then sees()), so a
+    guard alerted by another guard's sighting starts chasing on the next
+    tick. The old per-guard loop moved and looked guard by guard, which let
+    guards later in the list chase within the same tick.
 
-    def sees_player(self, player, walls, emp_active):
-        if emp_active:
-            return False
-        if player.invisible and time.time() < player.invis_end:
-            return False
+    The arrays are views on buffers that grow geometrically, so adding n
+    guards costs O(n) copying in total.
+    """
 
-        vec = player.pos - self.pos
-        dist = vec.length()
-        if dist == 0 or dist > self.vision:
-            return False
+    # name, row shape, dtype; patrol bounds are (start_x, start_y) / (end_x, end_y)
+    FIELDS = (("pos", (2,), float), ("vel", (2,), float), ("facing", (2,), float),
+              ("start", (2,), float), ("end", (2,), float), ("speed", (), float),
+              ("vision", (), float), ("pattern", (), np.int8), ("alert", (), bool),
+              ("alert_timer", (), float))
 
-        direction_to_player = vec.normalize()
-        dot = max(-1, min(1, self.facing.dot(direction_to_player)))
-        angle = math.acos(dot)
-        max_angle = math.radians(80) / 2
-        if angle > max_angle:
-            return False
+    def __init__(self):
+        self.buffers = {name: np.zeros((0,) + shape, dtype) for name, shape, dtype in self.FIELDS}
+        self.chase_target = []
+        self.views = []
+        self.resize(0)
 
-        if not line_of_sight(self.pos, player.pos, walls):
-            return False
+    def resize(self, n):
+        """Point the public arrays at the first `n` rows of the buffers."""
+        for name, buf in self.buffers.items():
+            setattr(self, name, buf[:n])
 
-        return True
+    def __len__(self):
+        return len(self.views)
+
+    def __iter__(self):
+        return iter(self.views)
 
-    def alert_nearby(self, guards):
-        for g in guards:
-            if g is not self and self.pos.distance_to(g.pos) < 120:
-                g.alert = True
-                g.alert_timer = 3.0
-                g.chase_target = self.pos
+    def __getitem__(self, i):
+        return self.views[i]
 
-    def draw(self, screen):
+    def add(self, pos, patrol_range, vision_range, speed, pattern="horizontal"):
+        """Append a guard; returns its row index."""
+        x, y = pos
+        half = patrol_range / 2
+        # define patrol bounds
+        if pattern == "horizontal":
+            start, end, vel = (x - half, y), (x + half, y), (speed, 0)
+        elif pattern == "vertical":
+            start, end, vel = (x, y - half), (x, y + half), (0, speed)
+        else:  # box pattern
+            start, end, vel = (x - half, y - half), (x + half, y + half), (speed, 0)
+
+        i = len(self.views)
+        bufs = self.buffers
+        if i == len(bufs["pos"]):
+            for name, buf in bufs.items():
+                grown = np.zeros((max(8, 2 * i),) + buf.shape[1:], buf.dtype)
+                grown[:i] = buf
+                bufs[name] = grown
+        row = {"pos": (x, y), "vel": vel, "facing": (1, 0), "start": start, "end": end,
+               "speed": speed, "vision": vision_range, "alert": False, "alert_timer": 0.0,
+               "pattern": PATTERNS.index(pattern) if pattern in PATTERNS else 2}
+        for name, value in row.items():
+            bufs[name][i] = value
+        self.resize(i + 1)
+        self.chase_target.append(None)
+
+        view = Guard.__new__(Guard)
+        view.batch, view.i = self, i
+        self.views.append(view)
+        return i
+
+    def remove(self, i):
+        """Drop row `i`; the last row moves into its place."""
+        last = len(self.views) - 1
+        for buf in self.buffers.values():
+            buf[i] = buf[last]
+        self.resize(last)
+        self.chase_target[i] = self.chase_target[last]
+        self.chase_target.pop()
+        self.views.pop()
+
+    # ----------------- MOVEMENT -----------------
+
+    def update(self, player_pos=None, nav=None, idx=None):
+        """Advance guards `idx` (default: all) by one tick."""
+        idx = np.arange(len(self.views)) if idx is None else np.asarray(idx)
+        if player_pos is not None:
+            chasing = idx[self.alert[idx]]
+            idx = idx[~self.alert[idx]]
+            for i in chasing.tolist():
+                self.chase(i, player_pos, nav)
+        if len(idx):
+            self.patrol(idx)
+
+    def chase(self, i, player_pos, nav=None):
+        # chase player, routing around walls when a nav grid is given
+        pos = pygame.Vector2(*self.pos[i])
+        target = player_pos
+        if nav is not None and not line_of_sight(pos, player_pos, nav.grid):
+            target = nav.next_waypoint(pos, player_pos)
+        diff = target - pos
+        if diff.length_squared() > 1:
+            direction = diff.normalize()
+            self.vel[i] = direction * (self.speed[i] * 1.6)
+            self.facing[i] = direction
+        self.pos[i] += self.vel[i]
+        self.alert_timer[i] -= DT
+        if self.alert_timer[i] <= 0:
+            self.alert[i] = False
+
+    def patrol(self, idx):
+        if len(idx) < VECTOR_MIN:
+            for i in idx.tolist():
+                self.patrol_one(i)
+            return
+
+        pos, vel = self.pos, self.vel
+        speed = self.speed[idx]
+        pattern = self.pattern[idx]
+        heading = vel[idx]  # before this tick
+        pos[idx] += heading
+        moved = pos[idx]
+        done = np.zeros(len(idx), bool)
+        for kind, turns in PATROL_TURNS.items():
+            for axis, at_end, sign, new_vel, new_facing in turns:
+                bound = (self.end if at_end else self.start)[idx, axis]
+                hit = (pattern == kind) & ~done
+                hit &= moved[:, axis] >= bound if at_end else moved[:, axis] <= bound
+                if sign:
+                    hit &= sign * heading[:, axis] > 0
+                if not hit.any():
+                    continue
+                done |= hit
+                rows = idx[hit]
+                pos[rows, axis] = bound[hit]
+                for k, v in enumerate(new_vel):
+                    if v is not None:
+                        vel[rows, k] = v * speed[hit]
+                self.facing[rows] = new_facing
+
+    def patrol_one(self, i):
+        """patrol() for a single guard in plain Python (small batches)."""
+        pos = self.pos[i].tolist()
+        vel = self.vel[i].tolist()
+        speed = float(self.speed[i])
+        pos[0] += vel[0]
+        pos[1] += vel[1]
+        for axis, at_end, sign, new_vel, new_facing in PATROL_TURNS[int(self.pattern[i])]:
+            bound = float((self.end if at_end else self.start)[i, axis])
+            if (pos[axis] >= bound if at_end else pos[axis] <= bound) and (not sign or sign * vel[axis] > 0):
+                pos[axis] = bound
+                vel = [v * speed if v is not None else old for v, old in zip(new_vel, vel)]
+                self.facing[i] = new_facing
+                break
+        self.pos[i] = pos
+        self.vel[i] = vel
+
+    # ----------------- PERCEPTION -----------------
+
+    def sees(self, player, grid, emp_active, idx=None):
+        """Bool array: which guards (`idx`, default all) can see the player.
+
+        Range and cone are dot-product tests over the whole batch; the wall
+        raycast only runs for guards that pass both.
+        """
+        idx = np.arange(len(self.views)) if idx is None else np.asarray(idx)
+        seen = np.zeros(len(idx), bool)
+        if emp_active or player.invisible or not len(idx):
+            return seen
+
+        px, py = player.pos
+        if len(idx) < VECTOR_MIN:
+            for k, i in enumerate(idx.tolist()):
+                gx, gy = self.pos[i].tolist()
+                fx, fy = self.facing[i].tolist()
+                if in_cone(px - gx, py - gy, fx, fy, float(self.vision[i])) \
+                        and line_of_sight((gx, gy), (px, py), grid):
+                    seen[k] = True
+            return seen
+
+        vec = np.array((px, py)) - self.pos[idx]
+        facing = self.facing[idx]
+        cand = in_cone(vec[:, 0], vec[:, 1], facing[:, 0], facing[:, 1], self.vision[idx])
+
+        for k in np.flatnonzero(cand).tolist():
+            gx, gy = self.pos[idx[k]]
+            if line_of_sight((gx, gy), (px, py), grid):
+                seen[k] = True
+        return seen
+
+    def alert_nearby(self, i, radius=120):
+        d = self.pos - self.pos[i]
+        near = np.einsum("ij,ij->i", d, d) < radius * radius
+        near[i] = False
+        self.alert[near] = True
+        self.alert_timer[near] = 3.0
+        for j in np.flatnonzero(near).tolist():
+            self.chase_target[j] = pygame.Vector2(*self.pos[i])
+
+class Guard:
+    """A single guard – a view on one row of a GuardBatch.
+
+    Constructed directly it gets a one-guard batch of its own, so the
+    per-guard API keeps working outside a Simulation.
+    """
+
+    def __init__(self, pos, patrol_range, vision_range, speed, pattern="horizontal", batch=None):
+        self.batch = batch if batch is not None else GuardBatch()
+        self.i = self.batch.add(pos, patrol_range, vision_range, speed, pattern)
+
+    def _vec(name):
+        def get(self):
+            return pygame.Vector2(*getattr(self.batch, name)[self.i])
+        def set(self, value):
+            getattr(self.batch, name)[self.i] = tuple(value)
+        return property(get, set)
+
+    def _scalar(name, kind):
+        def get(self):
+            return kind(getattr(self.batch, name)[self.i])
+        def set(self, value):
+            getattr(self.batch, name)[self.i] = value
+        return property(get, set)
+
+    pos = _vec("pos")
+    vel = _vec("vel")
+    facing = _vec("facing")
+    speed = _scalar("speed", float)
+    vision = _scalar("vision", float)
+    alert = _scalar("alert", bool)
+    alert_timer = _scalar("alert_timer", float)
+    del _vec, _scalar
+
+    @property
+    def pattern(self):
+        return PATTERNS[self.batch.pattern[self.i]]
+
+    @property
+    def chase_target(self):
+        return self.batch.chase_target[self.i]
+
+    @chase_target.setter
+    def chase_target(self, value):
+        self.batch.chase_target[self.i] = value
+
+    @property
+    def rect(self):
+        rect = pygame.Rect(0, 0, 24, 24)
+        rect.center = tuple(self.batch.pos[self.i])
+        return rect
+
+    def update(self, player_pos=None, nav=None):
+        self.batch.update(player_pos, nav, [self.i])
+
+    def sees_player(self, player, grid, emp_active):
+        return bool(self.batch.sees(player, grid, emp_active, [self.i])[0])
+
+    def alert_nearby(self, guards=None):
+        self.batch.alert_nearby(self.i)
+
+    def draw(self, screen, pos=None):
         col = (255, 120, 120) if self.alert else GUARD_COLOR
-        pygame.draw.rect(screen, col, self.rect, border_radius=4)
+        rect = self.rect
+        if pos is not None:
+            rect.center = (round(pos[0]), round(pos[1]))
+        return pygame.draw.rect(screen, col, rect, border_radius=4)
+
+    def draw_cone(self, layer, grid=None, pos=None, offset=(0, 0)):
+        """Draw the vision cone into a shared overlay; returns the touched rect.
+
+        With a grid, every ray is cut off at the first wall so the cone
+        shows what the guard can actually see. `pos` overrides the apex
+        (world coordinates); `offset` maps world to layer coordinates.
+        """
+        fx, fy = self.batch.facing[self.i]
+        px, py = self.batch.pos[self.i].tolist() if pos is None else pos
+        heading = round(math.degrees(math.atan2(fy, fx))) % 360
+        dx, dy = offset
+        pts = [(px + dx, py + dy)]
+        for ox, oy in cone_offsets(heading, self.batch.vision[self.i]):
+            if grid is not None:
+                t = ray_hit((px, py), (px + ox, py + oy), grid)
+                if t is not None:
+                    ox, oy = ox * t, oy * t
+            pts.append((px + ox + dx, py + oy + dy))
+        return pygame.draw.polygon(layer, VISION_COLOR, pts)
+
+# -------------------- SIMULATION --------------------
+
+class TickInput:
+    """Player input for one simulation tick (emp / escape are key presses)."""
+
+    __slots__ = ("up", "down", "left", "right", "crouch", "emp", "escape")
+
+    def __init__(self, up=False, down=False, left=False, right=False,
+                 crouch=False, emp=False, escape=False):
+        self.up = up
+        self.down = down
+        self.left = left
+        self.right = right
+        self.crouch = crouch
+        self.emp = emp
+        self.escape = escape
+
+    def mask(self):
+        """Pack into one byte (see INPUT_BITS)."""
+        m = 0
+        for bit, name in enumerate(INPUT_BITS):
+            if getattr(self, name):
+                m |= 1 << bit
+        return m
+
+    @classmethod
+    def from_mask(cls, m):
+        return cls(*(bool(m >> INPUT_BITS.index(name) & 1) for name in cls.__slots__))
+
+# bit order of TickInput.mask(): W A S D SHIFT E ESC
+INPUT_BITS = ("up", "left", "down", "right", "crouch", "emp", "escape")
+
+class Simulation:
+    """Game rules for one level, advanced in fixed ticks of DT seconds.
+
+    Headless: no display, mixer or wall clock. Everything the front end
+    needs to react to (sounds, particles, shake, re-baking the background)
+    is reported through `events`, which is refilled on every step().
+    `result` becomes "caught", "timeout", "escaped" or "quit".
+    """
+
+    def __init__(self, map_data, diff_settings):
+        self.diff_settings = diff_settings
+        self.level = map_data if isinstance(map_data, CompiledLevel) else ChunkedLevel(map_data)
+        self.grid = TileGrid(map_data)
+
+        px, py = self.level.find("P")
+        self.player = Player((px * TILE + TILE // 2, py * TILE + TILE // 2))
+        exit_tile = self.level.find("E")
+        self.exit_rect = None
+        if exit_tile:
+            self.exit_rect = pygame.Rect(exit_tile[0] * TILE + 8, exit_tile[1] * TILE + 8, 24, 24)
+
+        # pickups and doors of the loaded chunks only; doors act like walls
+        # until the key is used
+        self.entities = EntityStore()
+        self.treasures_left = self.level.count("T")
+        self.taken = set()  # tiles of collected pickups, skipped when a chunk reloads
+
+        # collision index: walls are static, door handles are kept for unlocking
+        self.wall_index = SpatialHash()
+        self.door_handles = set()
+        self.nav = NavGrid(self.grid)
+        self.sound = SoundMap(self.grid)
 
-        # vision cone
-        cone_surf = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
-        base_angle = math.atan2(self.facing.y, self.facing.x) - math.radians(80) / 2
-        pts = [self.pos.xy]
-        for i in range(40):
-            ang = base_angle + (math.radians(80) * i / 40)
-            x = self.pos.x + math.cos(ang) * self.vision
-            y = self.pos.y + math.sin(ang) * self.vision
-            pts.append((x, y))
-        pygame.draw.polygon(cone_surf, VISION_COLOR, pts)
-        screen.blit(cone_surf, (0, 0))
+        self.has_key = False
+
+        self.ticks = 0
+        self.time = 0.0
+        self.detect_meter = 0.0
+        self.peak_meter = 0.0
+        self.emp_available = diff_settings["emp"]
+        self.emp_end_time = 0
+        # the hand-made levels get two minutes; big vaults get more
+        self.time_limit = 120 * diff_settings["time_mult"] * max(1, (self.grid.cols + self.grid.rows) // 100)
+
+        self.events = []
+        self.result = None
+        self.gained = 0
+
+        self.guards = GuardBatch()
+        self.guard_ids = []  # reading-order number of the guard in each batch row
+        self.loaded = {}     # chunk -> what it put into the lists above
+        self.window = set()
+        self.center = None
+        self.refresh_chunks()
+        self.events = []
+
+    @property
+    def emp_active(self):
+        return self.time < self.emp_end_time
+
+    # ----------------- CHUNKS -----------------
+
+    def refresh_chunks(self):
+        """Keep the chunks around the player loaded and their guards running.
+
+        Called every tick; only does work when the player crosses into another
+        chunk (plus a guard check every PARK_INTERVAL ticks), so the cost per
+        tick does not grow with the size of the map.
+        """
+        center = self.level.chunk_of(*self.player.pos)
+        if center != self.center:
+            self.center = center
+            window = self.level.window(center)
+            for c in self.window - window:
+                self.unload_chunk(c)
+            for c in sorted(window - self.window, key=lambda c: (c[1], c[0])):
+                self.load_chunk(c)
+            self.window = window
+            self.spawn_guards()
+            self.events.append(("chunks",))
+        elif not self.level.fits_window and self.ticks % PARK_INTERVAL == 0:
+            self.spawn_guards()
+
+    def load_chunk(self, c):
+        compiled = self.level.chunk(*c)
+        rec = {"walls": [], "entities": [], "guards": []}
+        for r in compiled["walls"]:
+            rec["walls"].append(self.wall_index.insert(pygame.Rect(r)))
+
+        entities = self.entities
+        for ch, x, y in compiled["entities"]:
+            if (x, y) in self.taken:
+                continue
+            wx, wy = x * TILE, y * TILE
+            if ch in PICKUPS:
+                rec["entities"].append(entities.add(ch, pygame.Rect(wx + 8, wy + 8, 24, 24), (x, y)))
+            elif ch == "D":
+                rect = pygame.Rect(wx, wy, TILE, TILE)
+                handle = None
+                if not self.has_key:
+                    handle = self.wall_index.insert(rect)
+                    self.door_handles.add(handle)
+                rec["entities"].append(entities.add(ch, rect, (x, y), handle))
+            elif ch == "G":
+                rec["guards"].append((compiled["ordinals"][(x, y)], (wx + TILE // 2, wy + TILE // 2)))
+        self.loaded[c] = rec
+
+    def unload_chunk(self, c):
+        rec = self.loaded.pop(c)
+        for handle in rec["walls"]:
+            self.wall_index.remove(handle)
+        entities = self.entities
+        for handle in rec["entities"]:
+            slot = entities.slot(handle)
+            if slot is None:
+                continue  # picked up
+            blocker = entities.blocker[slot]
+            if blocker is not None:
+                self.wall_index.remove(blocker)
+                self.door_handles.discard(blocker)
+            entities.remove(handle)
+
+    def chunks_in(self, rect):
+        """Loaded chunks overlapping the world-space `rect`."""
+        size = CHUNK * TILE
+        return [c for c in ((cx, cy)
+                            for cy in range(rect.top // size, (rect.bottom - 1) // size + 1)
+                            for cx in range(rect.left // size, (rect.right - 1) // size + 1))
+                if c in self.loaded]
+
+    def pickups_in(self, rect):
+        """(colour, rect) of the uncollected pickups overlapping `rect`."""
+        entities = self.entities
+        out = []
+        for c in self.chunks_in(rect):
+            for handle in self.loaded[c]["entities"]:
+                slot = entities.slot(handle)
+                if slot is not None and entities.kind[slot] in PICKUPS and entities.rect[slot].colliderect(rect):
+                    out.append((PICKUPS[entities.kind[slot]]["color"], entities.rect[slot]))
+        return out
+
+    def spawn_guards(self):
+        """Park guards that wandered out of the loaded chunks and (re)start
+        every guard posted inside them at its post."""
+        guards = self.guards
+        if not self.level.fits_window:
+            for i in range(len(guards) - 1, -1, -1):
+                if self.level.chunk_of(*guards.pos[i]) not in self.window:
+                    guards.remove(i)
+                    self.guard_ids[i] = self.guard_ids[-1]
+                    self.guard_ids.pop()
+
+        active = set(self.guard_ids)
+        posted = sorted(g for c in self.window for g in self.loaded[c]["guards"] if g[0] not in active)
+        for ordinal, pos in posted:
+            guards.add(
+                pygame.Vector2(pos),
+                patrol_range=220,
+                vision_range=self.diff_settings["vision"],
+                speed=self.diff_settings["guard"],
+                pattern=PATTERNS[ordinal % 3],
+            )
+            self.guard_ids.append(ordinal)
+
+    def open_doors(self):
+        """The key unlocks every door: drop the loaded ones from the wall index."""
+        entities = self.entities
+        for handle in self.door_handles:
+            self.wall_index.remove(handle)
+        self.door_handles = set()
+        for slot, blocker in enumerate(entities.blocker):
+            if blocker is not None:
+                entities.blocker[slot] = None
+        self.grid.set_doors_open(True)
+        self.nav.invalidate()
+        self.sound.invalidate()
+
+    @property
+    def time_left(self):
+        return max(0.0, self.time_limit - self.time)
+
+    # ----------------- SOUND PROPAGATION (S2) -----------------
+
+    def emit_sound(self, source_pos, radius):
+        """Advanced sound: travels along corridors (around corners), walls block.
+
+        `radius` is a distance in pixels (straight in line of sight, else
+        walking), capped at the SoundMap range.
+        """
+        guards = self.guards
+        if not len(guards):
+            return
+        heard = ~guards.alert & (self.sound.distances(source_pos, guards.pos) <= radius)
+        guards.alert[heard] = True
+        guards.alert_timer[heard] = 2.5
+        for i in np.flatnonzero(heard).tolist():
+            guards.chase_target[i] = source_pos
+
+    # ----------------- TICK -----------------
+
+    def step(self, inp):
+        self.events = []
+        emp_active = self.emp_active
+        self.ticks += 1
+        self.time = self.ticks * DT
+
+        if inp.escape:
+            self.result = "quit"
+
+        if inp.emp and self.emp_available:
+            self.emp_available = False
+            self.emp_end_time = self.time + 3
+            self.events.append(("sound", "emp"))
+            self.emit_sound(self.player.pos, 120)  # EMP sound
+
+        self.player.crouch = inp.crouch
+
+        base_speed = CROUCH_SPEED if self.player.crouch else PLAYER_SPEED
+        dx = (inp.right - inp.left) * base_speed
+        dy = (inp.down - inp.up) * base_speed
+        if dx != 0 and dy != 0:
+            dx *= 0.7071
+            dy *= 0.7071
+
+        prev_pos = self.player.pos.copy()
+        with profiler.section("sim.player"):
+            self.player.move(dx, dy, self.wall_index, self.time)
+            self.refresh_chunks()
+
+        # sound from running (only if not crouching)
+        if not self.player.crouch and (self.player.pos - prev_pos).length() > 0.5:
+            with profiler.section("sim.sound"):
+                self.emit_sound(self.player.pos, 130)
+
+        with profiler.section("sim.guards"):
+            guards = self.guards
+            guards.update(self.player.pos, self.nav)
+            seeing = guards.sees(self.player, self.grid, emp_active)
+            seen = bool(seeing.any())
+            for i in np.flatnonzero(seeing).tolist():
+                if not guards.alert[i]:
+                    guards.alert[i] = True
+                    guards.alert_timer[i] = 2.5
+                    guards.alert_nearby(i)
+        if seen:
+            self.events.append(("spotted",))
+
+        # detection logic
+        if seen:
+            if self.player.crouch:
+                self.detect_meter += 0.8 * DT
+            else:
+                self.detect_meter += 1.8 * DT
+        else:
+            self.detect_meter = max(0.0, self.detect_meter - 1.0 * DT)
+        self.peak_meter = max(self.peak_meter, self.detect_meter)
+
+        if self.detect_meter >= self.diff_settings["detect"]:
+            self.events.append(("sound", "alarm"))
+            self.result = "caught"
+
+        with profiler.section("sim.pickups"):
+            entities = self.entities
+            for slot, handle in entities.touching(self.player.rect):
+                kind = entities.kind[slot]
+                self.taken.add(entities.tile[slot])
+                entities.remove(handle)
+                if kind == "T":
+                    self.treasures_left -= 1
+                    self.events.append(("sound", "collect"))
+                    self.events.append(("treasure", self.player.pos.copy()))
+                elif kind == "K":
+                    self.has_key = True
+                    self.open_doors()
+                    self.events.append(("doors_open",))
+                    self.events.append(("sound", "collect"))
+                else:
+                    powerup = PICKUPS[kind]
+                    for name, value in powerup["effect"].items():
+                        setattr(self.player, name, value)
+                    setattr(self.player, powerup["until"], self.time + powerup["duration"])
+                    self.events.append(("sound", "collect"))
+
+        # time limit
+        if self.time > self.time_limit:
+            self.events.append(("sound", "alarm"))
+            self.result = "timeout"
+
+        # exit condition: all treasures collected + exit reached
+        if self.exit_rect and not self.treasures_left and self.player.rect.colliderect(self.exit_rect):
+            # scoring: based on remaining time and difficulty
+            remaining = max(0, self.time_limit - self.time)
+            gained = int(1000 + remaining * 5 - self.detect_meter * 50)
+            self.gained = max(0, gained)
+            self.events.append(("sound", "win"))
+            self.result = "escaped"
+
+        return self.result
+
+# -------------------- REPLAYS --------------------
+
+REPLAY_MAGIC = b"HRPL"
+REPLAY_VERSION = 3  # 3: guards on tiles in sight of a noise hear by exact distance
+
+def map_hash(map_data):
+    if isinstance(map_data, CompiledLevel):
+        return map_data.source_hash
+    return hashlib.sha1("\n".join(map_data).encode()).hexdigest()
+
+def write_varint(out, n):
+    while n >= 0x80:
+        out.append(n & 0x7F | 0x80)
+        n >>= 7
+    out.append(n)
+
+def read_varint(data, pos):
+    n = shift = 0
+    while True:
+        b = data[pos]
+        pos += 1
+        n |= (b & 0x7F) << shift
+        if b < 0x80:
+            return n, pos
+        shift += 7
+
+class Replay:
+    """One recorded level attempt: a TickInput mask per tick plus the seed
+    and settings needed to re-run it exactly.
+
+    File layout: magic, version (u8), header length (u32), JSON header, then
+    the masks run-length encoded as (mask byte, varint run) pairs, so idle
+    stretches cost two bytes no matter how long they are.
+    """
+
+    def __init__(self, map_data, level_index, diff_name, settings, seed, vault=None):
+        self.map_hash = map_hash(map_data)
+        self.vault = vault  # (cols, rows, seed) of a generated vault, else None
+        self.level_index = level_index
+        self.diff_name = diff_name
+        self.settings = dict(settings)
+        self.seed = seed
+        self.masks = bytearray()
+        self.result = None
+        self.score = 0
+
+    def record(self, inp):
+        self.masks.append(inp.mask())
+
+    def inputs(self):
+        for m in self.masks:
+            yield TickInput.from_mask(m)
+
+    def encode(self):
+        header = json.dumps({
+            "map": self.map_hash, "level": self.level_index, "difficulty": self.diff_name,
+            "settings": self.settings, "seed": self.seed, "ticks": len(self.masks),
+            "result": self.result, "score": self.score, "vault": self.vault,
+        }).encode()
+        out = bytearray(REPLAY_MAGIC)
+        out += struct.pack("<BI", REPLAY_VERSION, len(header))
+        out += header
+        masks, i, n = self.masks, 0, len(self.masks)
+        while i < n:
+            j = i
+            while j < n and masks[j] == masks[i]:
+                j += 1
+            out.append(masks[i])
+            write_varint(out, j - i)
+            i = j
+        return bytes(out)
+
+    @classmethod
+    def decode(cls, data):
+        if data[:4] != REPLAY_MAGIC:
+            raise ValueError("not a heist replay")
+        version, size = struct.unpack_from("<BI", data, 4)
+        if version != REPLAY_VERSION:
+            raise ValueError(f"unsupported replay version {version}")
+        pos = 9 + size
+        header = json.loads(data[9:pos])
+        replay = cls.__new__(cls)
+        replay.map_hash = header["map"]
+        replay.vault = header.get("vault")
+        replay.level_index = header["level"]
+        replay.diff_name = header["difficulty"]
+        replay.settings = header["settings"]
+        replay.seed = header["seed"]
+        replay.result = header["result"]
+        replay.score = header["score"]
+        masks = bytearray()
+        while pos < len(data):
+            m = data[pos]
+            run, pos = read_varint(data, pos + 1)
+            masks += bytes((m,)) * run
+        replay.masks = masks
+        return replay
+
+    def save(self, path):
+        """Write to `path`, or to `name-2.hrpl`, `name-3.hrpl`, ... when that
+        is taken (never overwrites); returns the path written."""
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        data = self.encode()
+        stem, ext = os.path.splitext(path)
+        n = 1
+        while True:
+            try:
+                with open(path, "xb") as f:
+                    f.write(data)
+                return path
+            except FileExistsError:
+                n += 1
+                path = f"{stem}-{n}{ext}"
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as f:
+            return cls.decode(f.read())
+
+    def level_map(self):
+        """The map this replay was recorded on."""
+        if self.vault:
+            return generate_vault(*self.vault)
+        return LEVELS[self.level_index]
+
+    def simulate(self, map_data):
+        """Re-run the recorded inputs headless; returns the finished Simulation."""
+        if map_hash(map_data) != self.map_hash:
+            raise ValueError("replay was recorded on a different map")
+        sim = Simulation(map_data, self.settings)
+        for inp in self.inputs():
+            if sim.result is not None:
+                break
+            sim.step(inp)
+        return sim
+
+# -------------------- CAMERA --------------------
+
+class Camera:
+    """Viewport in world pixels that follows a point and stays inside the map.
+
+    Maps smaller than the window stay pinned to the top-left corner.
+    """
+
+    def __init__(self, width, height):
+        self.rect = pygame.Rect(0, 0, width, height)
+
+    @property
+    def offset(self):
+        """Add to a world position to get its screen position."""
+        return -self.rect.x, -self.rect.y
+
+    def follow(self, pos, world_w, world_h):
+        """Centre on `pos`; returns True if the view moved."""
+        r = self.rect
+        x = min(max(round(pos[0]) - r.width // 2, 0), max(0, world_w - r.width))
+        y = min(max(round(pos[1]) - r.height // 2, 0), max(0, world_h - r.height))
+        moved = (x, y) != r.topleft
+        r.topleft = (x, y)
+        return moved
+
+# -------------------- RUN HISTORY --------------------
+
+HISTORY_DB = os.path.join(os.path.dirname(os.path.abspath(__file__)), "history.db")
+_HISTORY_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    difficulty TEXT NOT NULL,
+    level TEXT NOT NULL,
+    score INTEGER NOT NULL,
+    time_used REAL NOT NULL,
+    peak_meter REAL NOT NULL,
+    seed INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_board ON runs (level, difficulty, score);
+CREATE TABLE IF NOT EXISTS campaigns (
+    id INTEGER PRIMARY KEY,
+    played_at REAL NOT NULL,
+    difficulty TEXT NOT NULL,
+    campaign TEXT NOT NULL,
+    score INTEGER NOT NULL
+);
+CREATE INDEX IF NOT EXISTS campaigns_board ON campaigns (campaign, difficulty, score);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT);
+"""
+_INSERT = {
+    "runs": "INSERT INTO runs (played_at, difficulty, level, score, time_used, peak_meter, seed) "
+            "VALUES (?, ?, ?, ?, ?, ?, ?)",
+    "campaigns": "INSERT INTO campaigns (played_at, difficulty, campaign, score) VALUES (?, ?, ?, ?)",
+}
+
+class RunHistory:
+    """Every completed level and finished campaign, in a local SQLite file.
+
+    record_*() only queue a row; one writer thread commits whatever has
+    queued up in a single transaction, at most every `flush_interval`
+    seconds, and flushes the rest at exit. Leaderboards read through the
+    (level, difficulty, score) indexes, so top-N and percentiles stay
+    instant with hundreds of thousands of runs.
+
+    The old highscores.json, when present, is imported once as campaign
+    scores. reader() opens an existing file for leaderboards only.
+    """
+
+    def __init__(self, path=HISTORY_DB, legacy_json="highscores.json", flush_interval=1.0):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.db = self.connect()
+        with self.db:
+            self.db.executescript(_HISTORY_SCHEMA)
+            self.import_json(legacy_json)
+        self.pending = queue.Queue()
+        self.writer = threading.Thread(target=self.write_loop, name="history", daemon=True)
+        self.writer.start()
+        atexit.register(self.close)
+
+    @classmethod
+    def reader(cls, path=HISTORY_DB):
+        """Read-only view for leaderboards: no schema setup, no JSON import,
+        no writer thread. Raises sqlite3.Error when the file doesn't exist."""
+        self = cls.__new__(cls)
+        self.path = path
+        self.db = sqlite3.connect(pathlib.Path(path).resolve().as_uri() + "?mode=ro", uri=True, timeout=30)
+        self.writer = None
+        return self
+
+    def connect(self):
+        db = sqlite3.connect(self.path, timeout=30)
+        db.execute("PRAGMA journal_mode=WAL")
+        db.execute("PRAGMA synchronous=NORMAL")
+        return db
+
+    def import_json(self, path):
+        if self.db.execute("SELECT 1 FROM meta WHERE key = 'imported_json'").fetchone():
+            return
+        try:
+            with open(path) as f:
+                scores = json.load(f)
+            played_at = os.path.getmtime(path)
+            if not isinstance(scores, dict):
+                raise ValueError(f"{path}: not a table of scores")
+            rows = [(played_at, diff, "levels", int(score)) for diff, score in scores.items() if score]
+        except (OSError, ValueError, TypeError):
+            rows = []
+        self.db.executemany(_INSERT["campaigns"], rows)
+        self.db.execute("INSERT INTO meta VALUES ('imported_json', ?)", (str(len(rows)),))
+
+    # ----------------- WRITES -----------------
+
+    def record_level(self, difficulty, level, score, time_used, peak_meter, seed):
+        self.pending.put(("runs", (time.time(), difficulty, level, int(score), float(time_used),
+                                   float(peak_meter), int(seed))))
+
+    def record_campaign(self, difficulty, campaign, score):
+        self.pending.put(("campaigns", (time.time(), difficulty, campaign, int(score))))
+
+    def write_loop(self):
+        db = self.connect()
+        stop = False
+        while not stop:
+            batch = [self.pending.get()]
+            deadline = time.monotonic() + self.flush_interval
+            while batch[-1] is not None:
+                try:
+                    batch.append(self.pending.get(timeout=max(0.0, deadline - time.monotonic())))
+                except queue.Empty:
+                    break
+            stop = batch[-1] is None
+            rows = {}
+            for item in batch:
+                if item is not None:
+                    rows.setdefault(item[0], []).append(item[1])
+            try:
+                with db:
+                    for table, values in rows.items():
+                        db.executemany(_INSERT[table], values)
+            except sqlite3.Error:
+                pass  # history is a nicety – a locked or read-only file never stops the game
+        db.close()
+
+    def close(self):
+        """Flush queued rows, stop the writer and close (safe to call twice)."""
+        if self.writer is not None and self.writer.is_alive():
+            self.pending.put(None)
+            self.writer.join()
+        self.db.close()
+
+    # ----------------- LEADERBOARDS -----------------
+
+    def top_levels(self, level, difficulty, n=10):
+        """[(score, time_used, peak_meter, seed, played_at)], best first."""
+        return self.db.execute(
+            "SELECT score, time_used, peak_meter, seed, played_at FROM runs "
+            "WHERE level = ? AND difficulty = ? ORDER BY score DESC LIMIT ?",
+            (level, difficulty, n)).fetchall()
+
+    def level_percentile(self, level, difficulty, q):
+        """Score at percentile q (0-100) of a level's runs, None without runs."""
+        where = "FROM runs WHERE level = ? AND difficulty = ?"
+        return self._percentile(where, (level, difficulty), q)
+
+    def top_campaigns(self, difficulty, campaign="levels", n=10):
+        """[(score, played_at)], best first."""
+        return self.db.execute(
+            "SELECT score, played_at FROM campaigns WHERE campaign = ? AND difficulty = ? "
+            "ORDER BY score DESC LIMIT ?", (campaign, difficulty, n)).fetchall()
+
+    def campaign_percentile(self, difficulty, q, campaign="levels"):
+        where = "FROM campaigns WHERE campaign = ? AND difficulty = ?"
+        return self._percentile(where, (campaign, difficulty), q)
+
+    def best_campaigns(self, campaign="levels"):
+        """{difficulty: best score} for one campaign."""
+        return dict(self.db.execute(
+            "SELECT difficulty, MAX(score) FROM campaigns WHERE campaign = ? GROUP BY difficulty",
+            (campaign,)).fetchall())
+
+    def _percentile(self, where, args, q):
+        # nearest rank, as Profiler.percentile; both walk the covering index only
+        (count,) = self.db.execute("SELECT COUNT(*) " + where, args).fetchone()
+        if not count:
+            return None
+        rank = min(count - 1, int(q / 100 * count))
+        return self.db.execute(f"SELECT score {where} ORDER BY score LIMIT 1 OFFSET ?",
+                               args + (rank,)).fetchone()[0]
+
+# -------------------- ASSETS --------------------
+
+FONT_CACHE = os.path.join(os.path.dirname(os.path.abspath(__file__)), ".cache", "fonts.json")
+
+def _make_font(path, size, bold, italic):
+    font = pygame.font.Font(path, size)
+    font.set_bold(bold)
+    font.set_italic(italic)
+    return font
+
+class FontCache:
+    """pygame.font.SysFont() with the resolved font file remembered on disk.
+
+    SysFont scans every installed font (fc-list on Linux) the first time it
+    is called. The file it settles on, plus whether bold/italic had to be
+    faked, only depends on the name and style, so later starts skip the scan
+    unless that file has gone away.
+    """
+
+    def __init__(self, path=FONT_CACHE):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.resolved = json.load(f)
+        except (OSError, ValueError):
+            self.resolved = {}
+
+    def get(self, name, size, bold=False, italic=False):
+        key = f"{name}:{'b' if bold else ''}{'i' if italic else ''}"
+        hit = self.resolved.get(key)
+        if hit is not None and (hit[0] is None or os.path.exists(hit[0])):
+            return _make_font(hit[0], size, hit[1], hit[2])
+
+        def resolve(path, size, fake_bold, fake_italic):
+            self.resolved[key] = [path, fake_bold, fake_italic]
+            return _make_font(path, size, fake_bold, fake_italic)
+
+        font = pygame.font.SysFont(name, size, bold, italic, constructor=resolve)
+        self.save()
+        return font
+
+    def save(self):
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            tmp = f"{self.path}.{os.getpid()}.tmp"
+            with open(tmp, "w") as f:
+                json.dump(self.resolved, f, indent=1)
+            os.replace(tmp, self.path)
+        except OSError:
+            pass  # read-only install: resolve again next start
+
+class AudioLoader:
+    """Opens the mixer and decodes sounds on one background thread.
+
+    Every sound is a future; play() skips sounds that are not decoded yet
+    (or failed to load), so the game never waits on audio. `done` resolves
+    once everything has been tried.
+    """
+
+    def __init__(self, sounds, music=None):
+        self.pool = ThreadPoolExecutor(max_workers=1, thread_name_prefix="audio")
+        # one worker: the mixer is open before the first Sound is decoded
+        self.mixer = self.pool.submit(self.open_mixer, music)
+        self.sounds = {name: self.pool.submit(pygame.mixer.Sound, path) for name, path in sounds.items()}
+        self.done = self.pool.submit(lambda: None)
+        self.pool.shutdown(wait=False)
+
+    @staticmethod
+    def open_mixer(music):
+        pygame.mixer.init()
+        if music:
+            try:
+                pygame.mixer.music.load(music)
+                pygame.mixer.music.set_volume(0.5)
+                pygame.mixer.music.play(-1)
+            except (pygame.error, OSError):
+                pass  # music is optional
+
+    def play(self, name):
+        future = self.sounds.get(name)
+        if future is not None and future.done() and future.exception() is None:
+            future.result().play()
+
+# -------------------- TEXT --------------------
+
+class TextCache:
+    """LRU of rendered text surfaces keyed by (font, text, colour).
+
+    HUD and menu labels are mostly identical from frame to frame, so a hit
+    replaces a font.render() call with a dict lookup.
+    """
+
+    def __init__(self, maxsize=256):
+        self.maxsize = maxsize
+        self.surfaces = OrderedDict()
+
+    def render(self, font, text, color):
+        key = (font, text, color)
+        surf = self.surfaces.get(key)
+        if surf is not None:
+            self.surfaces.move_to_end(key)
+            return surf
+        surf = font.render(text, True, color)
+        profiler.count("surfaces")
+        self.surfaces[key] = surf
+        if len(self.surfaces) > self.maxsize:
+            self.surfaces.popitem(last=False)
+        return surf
+
+class HudLayer:
+    """Text fields composited onto one transparent layer.
+
+    set() is called every frame with each field's current text; the layer is
+    only redrawn when one of them actually changed (the timer once a second,
+    the EMP line when it fires, ...), otherwise drawing it is a single blit.
+    """
+
+    def __init__(self, size, text):
+        self.text = text
+        self.layer = pygame.Surface(size, pygame.SRCALPHA)
+        self.fields = {}  # name -> (font, text, colour, pos)
+        self.dirty = False
+        self.rects = []
+
+    def set(self, name, font, text, color, pos):
+        value = (font, text, color, pos)
+        if self.fields.get(name) != value:
+            self.fields[name] = value
+            self.dirty = True
+
+    def draw(self, screen, under=None):
+        """Blit the layer; returns the rects whose text changed this frame.
+
+        `under` is what the screen shows beneath the HUD; when given (the
+        screen was not fully repainted), every rect the layer covers, and
+        where changed text used to be, is restored from it first: the layer
+        is alpha-blended, so blending it over last frame's copy would darken
+        the text edges a little more every frame.
+        """
+        changed = []
+        if self.dirty:
+            changed = self.rects
+            for r in self.rects:
+                self.layer.fill((0, 0, 0, 0), r)
+            self.rects = [self.layer.blit(self.text.render(font, text, color), pos)
+                          for font, text, color, pos in self.fields.values()]
+            changed = changed + self.rects
+            self.dirty = False
+        if under is not None:
+            screen.blits([(under, r, r) for r in changed or self.rects], doreturn=False)
+        screen.blits([(self.layer, r, r) for r in self.rects], doreturn=False)
+        return changed
 
 # -------------------- GAME CLASS --------------------
 
 class Game:
-    def __init__(self):
-        pygame.init()
-        pygame.mixer.init()
+    def __init__(self, dirty_rects=False, vault=None, history=HISTORY_DB):
+        # Music / sounds are optional – game runs without files. They load in
+        # the background while the window and the first menu come up.
+        self.audio = AudioLoader({
+            "alarm":   "sounds/alarm.wav",
+            "emp":     "sounds/emp.wav",
+            "win":     "sounds/win.wav",
+            "lose":    "sounds/lose.wav",
+            "collect": "sounds/collect.wav",
+        }, music="sounds/bg_music.mp3")
+        self.audio.done.add_done_callback(lambda _: startup.mark("audio", background=True))
+
+        pygame.display.init()
+        pygame.font.init()
         self.screen = pygame.display.set_mode((WIDTH, HEIGHT))
         pygame.display.set_caption("Pixel Bank Heist – Full Heist Edition")
         self.clock = pygame.time.Clock()
-        self.font = pygame.font.SysFont("segoeui", 20)
-        self.big = pygame.font.SysFont("segoeui", 42, bold=True)
-        self.small = pygame.font.SysFont("segoeui", 14)
-
-        # Music / sounds are optional – game runs without files
-        try:
-            pygame.mixer.music.load("sounds/bg_music.mp3")
-            pygame.mixer.music.set_volume(0.5)
-            pygame.mixer.music.play(-1)
-            self.sounds = {
-                "alarm":   pygame.mixer.Sound("sounds/alarm.wav"),
-                "emp":     pygame.mixer.Sound("sounds/emp.wav"),
-                "win":     pygame.mixer.Sound("sounds/win.wav"),
-                "lose":    pygame.mixer.Sound("sounds/lose.wav"),
-                "collect": pygame.mixer.Sound("sounds/collect.wav"),
-            }
-        except:
-            self.sounds = {}
+        startup.mark("display")
+        fonts = FontCache()
+        self.font = fonts.get("segoeui", 20)
+        self.big = fonts.get("segoeui", 42, bold=True)
+        self.small = fonts.get("segoeui", 14)
+        startup.mark("fonts")
 
         self.state = "difficulty"
         self.level_index = 0
         self.diff_name = "Medium"
         self.diff_settings = DIFFICULTIES[self.diff_name]
 
-        self.detect_meter = 0.0
-        self.emp_available = self.diff_settings["emp"]
-        self.emp_end_time = 0
-        self.start_time = time.time()
-        self.time_limit = 120 * self.diff_settings["time_mult"]
+        # the hand-made campaign, or one generated (cols, rows, seed) vault,
+        # built when the first heist starts rather than before the menu
+        self.vault = vault
+        self.levels = None if vault else LEVELS
 
         self.score = 0
         self.screen_shake = 0
-        self.particles = []
-
-        self.high_scores = self.load_high_scores()
-
-        self.load_level()
-
-    def load_high_scores(self):
-        if os.path.exists("highscores.json"):
+        self.particles = ParticlePool()
+
+        # layered rendering: the static background is baked per chunk when it
+        # first scrolls into view, the scene surface is reused every frame
+        self.scene = pygame.Surface((WIDTH, HEIGHT)).convert()
+        self.camera = Camera(WIDTH, HEIGHT)
+        self.backgrounds = {}
+        # profiling stays off until F3 (overlay) or F4 (record, then dump) asks for it
+        self.show_profiler = False
+        # all vision cones share one overlay; only last frame's cone rects get cleared
+        self.cone_layer = pygame.Surface((WIDTH, HEIGHT), pygame.SRCALPHA)
+        self.cone_rects = []
+        # labels are rendered once and reused; the HUD only redraws changed fields
+        self.text = TextCache()
+        self.hud = HudLayer((WIDTH, HEIGHT), self.text)
+        # dirty-rect mode: present only the regions that changed, and nothing
+        # at all on menus that look the same as last frame
+        self.dirty_rects = dirty_rects
+        self.full_present = True
+        self.partial = False
+        self.dirty = []
+        self.last_touched = []
+        self.pickups_drawn = None
+        self.meter_drawn = None
+        self.painted_view = None
+
+        # history=None (headless tools) plays without recording or a leaderboard
+        self.history = None
+        self.high_scores = {}
+        if history is not None:
             try:
-                with open("highscores.json", "r") as f:
-                    return json.load(f)
-            except:
-                return {k: 0 for k in DIFFICULTIES.keys()}
-        return {k: 0 for k in DIFFICULTIES.keys()}
-
-    def save_high_scores(self):
-        with open("highscores.json", "w") as f:
-            json.dump(self.high_scores, f)
+                self.history = RunHistory(history)
+                self.high_scores = self.history.best_campaigns(self.campaign_name())
+            except sqlite3.Error:
+                self.history = None  # unwritable directory: play on without a leaderboard
+        startup.mark("game state")
+
+    def campaign_name(self):
+        """Leaderboard key of what is being played: the campaign or one vault."""
+        if self.vault:
+            return "vault-{}x{}-{}".format(*self.vault)
+        return "levels"
+
+    def level_name(self):
+        if self.vault:
+            return self.campaign_name()
+        return os.path.splitext(LEVELS.names[self.level_index])[0]
 
     def load_level(self):
         self.diff_settings = DIFFICULTIES[self.diff_name]
-        walls, player_pos, guard_positions, treasures, exit_rect, keys, doors, powerups = load_level(
-            LEVELS[self.level_index]
-        )
-        self.walls = walls[:]  # copy
-        self.player = Player(player_pos)
-        self.treasures = treasures
-        self.exit_rect = exit_rect
-        self.keys = keys
-        self.doors = doors
-        self.powerups = powerups
-
-        # doors act like walls until key is used
-        self.walls.extend(self.doors)
+        if self.levels is None:
+            self.levels = [generate_vault(*self.vault)]
+        self.sim = Simulation(self.levels[self.level_index], self.diff_settings)
 
-        self.has_key = False
-
-        self.detect_meter = 0.0
-        self.emp_available = self.diff_settings["emp"]
-        self.emp_end_time = 0
-        self.start_time = time.time()
-        self.time_limit = 120 * self.diff_settings["time_mult"]
+        # every attempt is recorded; the seed drives all cosmetic randomness
+        self.seed = random.randrange(2 ** 32)
+        self.rng = random.Random(self.seed)
+        self.replay = Replay(self.levels[self.level_index], self.level_index, self.diff_name,
+                             self.diff_settings, self.seed, self.vault)
+        self.shake_offset = (0, 0)
 
         self.particles.clear()
         self.screen_shake = 0
-
-        self.guards = []
-        for i, g_pos in enumerate(guard_positions):
-            pattern = ["horizontal", "vertical", "box"][i % 3]
-            g = Guard(
-                g_pos,
-                patrol_range=220,
-                vision_range=self.diff_settings["vision"],
-                speed=self.diff_settings["guard"],
-                pattern=pattern,
-            )
-            self.guards.append(g)
-
-    # ----------------- SOUND PROPAGATION (S2) -----------------
-
-    def emit_sound(self, source_pos, radius):
-        """Advanced sound: sound travels with LOS, walls block."""
-        for g in self.guards:
-            if g.alert:
-                continue
-            dist = g.pos.distance_to(source_pos)
-            if dist <= radius and line_of_sight(source_pos, g.pos, self.walls):
-                g.alert = True
-                g.alert_timer = 2.5
-                g.chase_target = source_pos
+        self.backgrounds = {}
+        self.full_present = True
+        self.snapshot()
+
+    def snapshot(self):
+        """Remember positions before a tick so frames can interpolate."""
+        self.prev_player_pos = self.sim.player.pos.copy()
+        self.prev_guard_pos = self.sim.guards.pos.copy()
+        self.prev_guard_ids = list(self.sim.guard_ids)
+
+    def play_sound(self, name):
+        self.audio.play(name)
+
+    def handle_sim_events(self):
+        for event in self.sim.events:
+            kind = event[0]
+            if kind == "sound":
+                self.play_sound(event[1])
+            elif kind == "treasure":
+                # treasure sound / particles
+                for _ in range(15):
+                    vel = pygame.Vector2(self.rng.uniform(-1,1), self.rng.uniform(-1,1)) * 2
+                    self.particles.emit(event[1], vel, (255,255,0))
+            elif kind == "spotted":
+                # small camera shake when spotted
+                self.screen_shake = 6
+            elif kind == "doors_open":
+                self.backgrounds = {}  # re-bake without the doors in walls
+            elif kind == "chunks":
+                # backgrounds of chunks that were unloaded go with them
+                window = self.sim.window
+                self.backgrounds = {c: bg for c, bg in self.backgrounds.items() if c in window}
 
     # ----------------- STATE LOOPS -----------------
 
@@ -559,7 +2563,12 @@ class Game:
                     elif e.key == pygame.K_RETURN:
                         self.diff_name = options[index]
                         self.state = "menu"
+                if e.type == pygame.WINDOWEXPOSED:
+                    self.painted_view = None
 
+            if not self.needs_paint(("difficulty", index)):
+                self.clock.tick(FPS)
+                continue
             self.screen.fill(BG)
             self.draw_center("Select Difficulty", self.big, (255, 0, 180), -120)
 
@@ -570,6 +2579,7 @@ class Game:
             self.draw_center("↑ / ↓ and Enter", self.font, (200, 200, 200), 110)
 
             pygame.display.flip()
+            startup.first_frame()
             self.clock.tick(FPS)
 
     def menu_loop(self):
@@ -580,7 +2590,12 @@ class Game:
                 if e.type == pygame.KEYDOWN:
                     self.load_level()
                     self.state = "play"
+                if e.type == pygame.WINDOWEXPOSED:
+                    self.painted_view = None
 
+            if not self.needs_paint(("menu", self.diff_name)):
+                self.clock.tick(FPS)
+                continue
             self.screen.fill(BG)
             self.draw_center("PIXEL BANK HEIST", self.big, (255, 0, 180), -80)
             self.draw_center(f"Difficulty: {self.diff_name}", self.font, TEXT_COLOR, -20)
@@ -589,126 +2604,109 @@ class Game:
             pygame.display.flip()
             self.clock.tick(FPS)
 
+    def read_input(self, inp):
+        """Fold this frame's pygame events + key state into `inp`.
+
+        Key presses (E / ESC) stay set until a tick consumes them, so a
+        press during a frame that runs no tick is not lost.
+        """
+        for e in pygame.event.get():
+            if e.type == pygame.QUIT:
+                pygame.quit(); sys.exit()
+            if e.type == pygame.KEYDOWN:
+                if e.key == pygame.K_e:
+                    inp.emp = True
+                if e.key == pygame.K_ESCAPE:
+                    inp.escape = True
+                if e.key == pygame.K_F3:
+                    self.show_profiler = not self.show_profiler
+                    profiler.enabled = self.show_profiler
+                if e.key == pygame.K_F4:
+                    if profiler.enabled:
+                        self.dump_profile()
+                    else:
+                        profiler.enabled = True  # the next F4 dumps what was recorded
+            if e.type == pygame.WINDOWEXPOSED:
+                self.full_present = True  # dirty rects would leave the uncovered part blank
+
+        keys = pygame.key.get_pressed()
+        inp.crouch = keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]
+        inp.up, inp.down = keys[pygame.K_w], keys[pygame.K_s]
+        inp.left, inp.right = keys[pygame.K_a], keys[pygame.K_d]
+        return inp
+
     def play_loop(self):
+        """Fixed-timestep loop: logic runs in DT ticks, rendering as often as
+        RENDER_FPS allows and interpolates between the last two ticks."""
+        accumulator = 0.0
+        inp = TickInput()
+        self.clock.tick()
         while self.state == "play":
-            dt = self.clock.tick(FPS) / 1000.0
-            emp_active = time.time() < self.emp_end_time
-
-            for e in pygame.event.get():
-                if e.type == pygame.QUIT:
-                    pygame.quit(); sys.exit()
-                if e.type == pygame.KEYDOWN:
-                    if e.key == pygame.K_e and self.emp_available:
-                        self.emp_available = False
-                        self.emp_end_time = time.time() + 3
-                        if "emp" in self.sounds: self.sounds["emp"].play()
-                        self.emit_sound(self.player.pos, 120)  # EMP sound
-                    if e.key == pygame.K_ESCAPE:
-                        self.state = "menu"
-
-            keys = pygame.key.get_pressed()
-            self.player.crouch = keys[pygame.K_LSHIFT] or keys[pygame.K_RSHIFT]
-
-            base_speed = CROUCH_SPEED if self.player.crouch else PLAYER_SPEED
-            dx = (keys[pygame.K_d] - keys[pygame.K_a]) * base_speed
-            dy = (keys[pygame.K_s] - keys[pygame.K_w]) * base_speed
-            if dx != 0 and dy != 0:
-                dx *= 0.7071
-                dy *= 0.7071
-
-            prev_pos = self.player.pos.copy()
-            self.player.move(dx, dy, self.walls)
-
-            # sound from running (only if not crouching)
-            if not self.player.crouch and (self.player.pos - prev_pos).length() > 0.5:
-                self.emit_sound(self.player.pos, 130)
-
-            seen = False
-            for g in self.guards:
-                g.update(self.player.pos if g.alert else None)
-                if g.sees_player(self.player, self.walls, emp_active):
-                    seen = True
-                    if not g.alert:
-                        g.alert = True
-                        g.alert_timer = 2.5
-                        g.alert_nearby(self.guards)
-                    # small camera shake when spotted
-                    self.screen_shake = 6
-
-            # detection logic
-            if seen:
-                if self.player.crouch:
-                    self.detect_meter += 0.8 / FPS
-                else:
-                    self.detect_meter += 1.8 / FPS
-            else:
-                self.detect_meter = max(0.0, self.detect_meter - 1.0 / FPS)
-
-            if self.detect_meter >= self.diff_settings["detect"]:
-                if "alarm" in self.sounds: self.sounds["alarm"].play()
+            dt = self.clock.tick(RENDER_FPS) / 1000.0
+            accumulator += dt
+            with profiler.section("input"):
+                self.read_input(inp)
+
+            result = None
+            steps = 0
+            while accumulator >= DT and result is None:
+                if steps == MAX_CATCH_UP:
+                    # too far behind (slow machine / stall): drop the backlog
+                    accumulator = 0.0
+                    break
+                self.snapshot()
+                self.replay.record(inp)
+                with profiler.section("sim"):
+                    result = self.sim.step(inp)
+                inp.emp = inp.escape = False
+                self.handle_sim_events()
+                with profiler.section("particles"):
+                    self.update_particles(DT)
+                self.update_shake()
+                accumulator -= DT
+                steps += 1
+
+            if result is not None:
+                self.save_replay(result)
+
+            if result == "quit":
+                self.state = "menu"
+            elif result == "caught":
                 self.state = "caught"
-
-            # treasure collection
-            for t in self.treasures[:]:
-                if self.player.rect.colliderect(t):
-                    self.treasures.remove(t)
-                    if "collect" in self.sounds: self.sounds["collect"].play()
-                    # treasure sound / particles
-                    for _ in range(15):
-                        vel = pygame.Vector2(random.uniform(-1,1), random.uniform(-1,1)) * 2
-                        self.particles.append(Particle(self.player.pos, vel, (255,255,0)))
-
-            # keys
-            for krect in self.keys[:]:
-                if self.player.rect.colliderect(krect):
-                    self.keys.remove(krect)
-                    self.has_key = True
-                    # unlock all doors (remove from walls)
-                    for d in self.doors:
-                        if d in self.walls:
-                            self.walls.remove(d)
-                    if "collect" in self.sounds: self.sounds["collect"].play()
-
-            # powerups
-            for p in self.powerups[:]:
-                if self.player.rect.colliderect(p["rect"]):
-                    if p["type"] == "speed":
-                        self.player.speed_boost = 1.8
-                        self.player.speed_end = time.time() + 5
-                    # could add invisibility, etc. later
-                    self.powerups.remove(p)
-                    if "collect" in self.sounds: self.sounds["collect"].play()
-
-            # time limit
-            elapsed = time.time() - self.start_time
-            if elapsed > self.time_limit:
-                if "alarm" in self.sounds: self.sounds["alarm"].play()
+            elif result == "timeout":
                 self.state = "gameover"
-
-            # exit condition: all treasures collected + exit reached
-            if self.exit_rect and not self.treasures and self.player.rect.colliderect(self.exit_rect):
-                # scoring: based on remaining time and difficulty
-                remaining = max(0, self.time_limit - elapsed)
-                gained = int(1000 + remaining * 5 - self.detect_meter * 50)
-                self.score += max(0, gained)
-                if "win" in self.sounds: self.sounds["win"].play()
+            elif result == "escaped":
+                self.score += self.sim.gained
+                if self.history:
+                    self.history.record_level(self.diff_name, self.level_name(), self.sim.gained,
+                                              self.sim.time, self.sim.peak_meter, self.seed)
                 self.next_level_or_finish()
                 return
 
-            self.update_particles()
-            self.draw(emp_active)
+            self.draw(self.sim.emp_active, min(1.0, accumulator / DT))
+            profiler.count("particles", len(self.particles))
+            profiler.count("guards", len(self.sim.guards))
+            profiler.end_frame(dt)
+
+    def save_replay(self, result):
+        self.replay.result = result
+        self.replay.score = self.sim.gained
+        name = time.strftime("%Y%m%d-%H%M%S") + f"_L{self.level_index + 1}_{self.diff_name}_{result}.hrpl"
+        try:
+            self.replay.save(os.path.join("replays", name))
+        except OSError:
+            pass  # replays are a debugging aid – never block the game on them
 
     def next_level_or_finish(self):
-        if self.level_index < len(LEVELS) - 1:
+        if self.level_index < len(self.levels) - 1:
             self.level_index += 1
             self.load_level()
             self.state = "play"
         else:
             # update high score
-            prev = self.high_scores.get(self.diff_name, 0)
-            if self.score > prev:
-                self.high_scores[self.diff_name] = self.score
-                self.save_high_scores()
+            if self.history:
+                self.history.record_campaign(self.diff_name, self.campaign_name(), self.score)
+            self.high_scores[self.diff_name] = max(self.score, self.high_scores.get(self.diff_name, 0))
             self.state = "gameover"
 
     def caught_loop(self):
@@ -719,7 +2717,12 @@ class Game:
                 if e.type == pygame.KEYDOWN:
                     self.load_level()
                     self.state = "play"
+                if e.type == pygame.WINDOWEXPOSED:
+                    self.painted_view = None
 
+            if not self.needs_paint(("caught",)):
+                self.clock.tick(FPS)
+                continue
             self.screen.fill(BG)
             self.draw_center("CAUGHT BY SECURITY 🚨", self.big, (255, 80, 80), -40)
             self.draw_center("Press any key to retry this level", self.font, TEXT_COLOR, 20)
@@ -740,7 +2743,12 @@ class Game:
                     self.score = 0
                     self.level_index = 0
                     self.state = "difficulty"
+                if e.type == pygame.WINDOWEXPOSED:
+                    self.painted_view = None
 
+            if not self.needs_paint(("gameover", self.score)):
+                self.clock.tick(FPS)
+                continue
             self.screen.fill(BG)
             self.draw_center("HEIST COMPLETE", self.big, (0, 255, 160), -60)
             self.draw_center(f"Total Score: {self.score}", self.font, TEXT_COLOR, 0)
@@ -752,106 +2760,260 @@ class Game:
 
     # ----------------- DRAWING & HUD -----------------
 
-    def update_particles(self):
-        for p in self.particles[:]:
-            p.update()
-            if not p.is_alive():
-                self.particles.remove(p)
-
-    def draw(self, emp_active):
-        # render to scene surface for screen shake
-        scene = pygame.Surface((WIDTH, HEIGHT))
-        scene.fill(BG)
+    def needs_paint(self, view):
+        """Static screens: False when `view` is what the window already shows."""
+        if not self.dirty_rects:
+            return True
+        if view == self.painted_view:
+            return False
+        self.painted_view = view
+        return True
 
-        # grid
-        for x in range(0, WIDTH, TILE):
-            pygame.draw.line(scene, GRID, (x, 0), (x, HEIGHT))
-        for y in range(0, HEIGHT, TILE):
-            pygame.draw.line(scene, GRID, (0, y), (WIDTH, y))
+    def update_shake(self):
+        """Per-tick screen shake offset (seeded, so replays shake the same)."""
+        if self.screen_shake > 0:
+            self.shake_offset = (self.rng.randint(-self.screen_shake, self.screen_shake),
+                                 self.rng.randint(-self.screen_shake, self.screen_shake))
+            self.screen_shake = max(0, self.screen_shake - 1)
+        else:
+            self.shake_offset = (0, 0)
 
-        # walls & doors
-        for w in self.walls:
-            pygame.draw.rect(scene, WALL, w)
-        for d in self.doors:
-            pygame.draw.rect(scene, DOOR_COLOR, d)
+    def update_particles(self, dt):
+        self.particles.update(dt)
 
-        # exit
-        if self.exit_rect:
-            pygame.draw.rect(scene, EXIT_COLOR, self.exit_rect)
+    def build_background(self, chunk):
+        """Bake the layers of one chunk that only change when doors open."""
+        size = CHUNK * TILE
+        area = pygame.Rect(chunk[0] * size, chunk[1] * size, size, size)
+        bg = pygame.Surface(area.size).convert()
+        bg.fill(BG)
+        ox, oy = -area.x, -area.y
 
-        # treasures
-        for t in self.treasures:
-            pygame.draw.rect(scene, TREASURE_COLOR, t)
+        # grid
+        for x in range(0, size, TILE):
+            pygame.draw.line(bg, GRID, (x, 0), (x, size))
+        for y in range(0, size, TILE):
+            pygame.draw.line(bg, GRID, (0, y), (size, y))
+
+        # walls & doors (doors stay drawn once open)
+        sim = self.sim
+        doors = sim.door_handles
+        for h in sim.wall_index.query(area):
+            if h not in doors:
+                pygame.draw.rect(bg, WALL, sim.wall_index.rects[h].move(ox, oy))
+        entities = sim.entities
+        for h in entities.query(area):
+            slot = entities.slot(h)
+            if entities.kind[slot] == "D":
+                pygame.draw.rect(bg, DOOR_COLOR, entities.rect[slot].move(ox, oy))
 
-        # keys
-        for k in self.keys:
-            pygame.draw.rect(scene, KEY_COLOR, k)
+        # exit
+        if sim.exit_rect and sim.exit_rect.colliderect(area):
+            pygame.draw.rect(bg, EXIT_COLOR, sim.exit_rect.move(ox, oy))
+        return bg
+
+    def draw_background(self, scene, view):
+        """Blit the baked chunk backgrounds under the viewport."""
+        sim = self.sim
+        size = CHUNK * TILE
+        world = pygame.Rect(0, 0, sim.level.chunk_cols * size, sim.level.chunk_rows * size)
+        if not world.contains(view):
+            scene.fill(BG)  # the view reaches past the map
+        for c in sim.chunks_in(view):
+            bg = self.backgrounds.get(c)
+            if bg is None:
+                bg = self.backgrounds[c] = self.build_background(c)
+                self.full_present = True
+            scene.blit(bg, (c[0] * size - view.x, c[1] * size - view.y))
+
+    def draw(self, emp_active, alpha=1.0):
+        """Render the current level; `alpha` (0..1) blends the previous tick's
+        positions with the current ones."""
+        with profiler.section("draw"):
+            self.draw_scene(emp_active, alpha)
+        if self.show_profiler:
+            panel = self.draw_profiler()
+            self.dirty.append(panel)
+            self.last_touched.append(panel)
+        with profiler.section("present"):
+            if self.partial:
+                pygame.display.update(self.dirty)
+            else:
+                pygame.display.flip()
+        # a shaken frame leaves the whole window offset, so the one after it
+        # must be presented in full as well
+        self.full_present = self.shake_offset != (0, 0)
+        self.painted_view = None
+
+    def draw_scene(self, emp_active, alpha):
+        sim = self.sim
+        player_pos = self.prev_player_pos.lerp(sim.player.pos, alpha)
+        camera = self.camera
+        if camera.follow(player_pos, sim.grid.cols * TILE, sim.grid.rows * TILE):
+            self.full_present = True
+        view = camera.rect
+        offset = camera.offset
 
-        # powerups
-        for p in self.powerups:
-            pygame.draw.rect(scene, POWERUP_COLOR, p["rect"])
+        # render to scene surface for screen shake
+        scene = self.scene
+        self.draw_background(scene, view)
+
+        # treasures, keys, powerups in view
+        for color, rect in sim.pickups_in(view):
+            pygame.draw.rect(scene, color, rect.move(offset))
+        # a pickup vanished: simplest to present the whole frame
+        pickups = sim.entities.count(PICKUPS)
+        if pickups != self.pickups_drawn:
+            self.pickups_drawn = pickups
+            self.full_present = True
 
         # guards & vision
-        for g in self.guards:
-            g.draw(scene)
+        with profiler.section("draw.cones"):
+            touched = self.draw_guards(scene, alpha, view)
 
         # player
-        self.player.draw(scene)
+        touched.append(sim.player.draw(scene, player_pos + offset))
 
         # particles
-        for p in self.particles:
-            p.draw(scene)
-
-        # apply screen shake
-        if self.screen_shake > 0:
-            offset_x = random.randint(-self.screen_shake, self.screen_shake)
-            offset_y = random.randint(-self.screen_shake, self.screen_shake)
-            self.screen_shake = max(0, self.screen_shake - 1)
+        area = self.particles.draw(scene, offset)
+        if area:
+            touched.append(area)
+
+        # apply screen shake; without it only moved sprites (where they are
+        # now and where they were last frame) need copying to the window
+        shaking = self.shake_offset != (0, 0)
+        self.partial = self.dirty_rects and not (self.full_present or shaking)
+        if self.partial:
+            self.dirty = touched + self.last_touched
+            self.screen.blits([(scene, r, r) for r in self.dirty], doreturn=False)
         else:
-            offset_x = offset_y = 0
-
-        self.screen.blit(scene, (offset_x, offset_y))
+            self.dirty = []
+            self.screen.blit(scene, self.shake_offset)
+        self.last_touched = touched
 
         # HUD overlay
+        with profiler.section("draw.hud"):
+            self.dirty += self.draw_hud(emp_active)
+
+    def draw_guards(self, scene, alpha, view):
+        sim = self.sim
+        layer = self.cone_layer
+        for r in self.cone_rects:
+            layer.fill((0, 0, 0, 0), r)
+        self.cone_rects = []
+        touched = []
+        guards = sim.guards
+        guard_pos = guards.pos
+        prev = self.prev_guard_pos
+        if self.prev_guard_ids == sim.guard_ids:
+            guard_pos = prev + (guard_pos - prev) * alpha
+        elif len(prev):
+            # guards were parked / spawned this tick and rows got reused:
+            # only blend a guard with its own previous position
+            row = {gid: i for i, gid in enumerate(self.prev_guard_ids)}
+            blended = guard_pos.copy()
+            for i, gid in enumerate(sim.guard_ids):
+                j = row.get(gid)
+                if j is not None:
+                    blended[i] = prev[j] + (guard_pos[i] - prev[j]) * alpha
+            guard_pos = blended
+        # a guard is drawn only if its body or the reach of its cone is in view.
+        # The batch only holds guards of the loaded chunk window (the chunk
+        # lookup is the spatial query), a dozen or so even in huge vaults;
+        # guards move every tick, so re-bucketing them would cost as much as
+        # this one vectorized bounds test.
+        reach = guards.vision + 12
+        visible = ((guard_pos[:, 0] + reach >= view.left) & (guard_pos[:, 0] - reach < view.right) &
+                   (guard_pos[:, 1] + reach >= view.top) & (guard_pos[:, 1] - reach < view.bottom))
+        ox, oy = -view.x, -view.y
+        for i in np.flatnonzero(visible).tolist():
+            g = guards[i]
+            x, y = guard_pos[i].tolist()
+            touched.append(g.draw(scene, (x + ox, y + oy)))
+            self.cone_rects.append(g.draw_cone(layer, sim.grid, (x, y), (ox, oy)))
+        if self.cone_rects:
+            area = self.cone_rects[0].unionall(self.cone_rects[1:])
+            scene.blit(layer, area, area)
+        return touched + self.cone_rects
+
+    def draw_hud(self, emp_active):
+        """Draw the HUD over the screen; returns the rects that changed."""
+        sim = self.sim
+        changed = []
         # detection bar
-        pygame.draw.rect(self.screen, (60, 0, 0), (20, 20, 200, 16), border_radius=4)
-        ratio = min(1.0, self.detect_meter / self.diff_settings["detect"])
+        bar = pygame.draw.rect(self.screen, (60, 0, 0), (20, 20, 200, 16), border_radius=4)
+        ratio = min(1.0, sim.detect_meter / self.diff_settings["detect"])
         pygame.draw.rect(self.screen, (255, 0, 0), (20, 20, 200 * ratio, 16), border_radius=4)
+        if ratio != self.meter_drawn:
+            self.meter_drawn = ratio
+            changed.append(bar)
+
+        hud = self.hud
 
         # time left
-        elapsed = time.time() - self.start_time
-        remaining = max(0, int(self.time_limit - elapsed))
-        time_text = f"Time: {remaining}s"
-        self.screen.blit(self.font.render(time_text, True, TEXT_COLOR), (20, 45))
+        remaining = int(sim.time_left)
+        hud.set("time", self.font, f"Time: {remaining}s", TEXT_COLOR, (20, 45))
 
         # level & difficulty
-        top_info = f"Level {self.level_index + 1}/{len(LEVELS)} | {self.diff_name}"
-        self.screen.blit(self.font.render(top_info, True, TEXT_COLOR), (20, 70))
+        top_info = f"Level {self.level_index + 1}/{len(self.levels)} | {self.diff_name}"
+        hud.set("level", self.font, top_info, TEXT_COLOR, (20, 70))
 
         # objectives info
-        obj = f"Treasures left: {len(self.treasures)}"
-        if self.keys:
+        obj = f"Treasures left: {sim.treasures_left}"
+        if sim.entities.counts["K"]:
             obj += " | Key: ❌"
-        elif self.has_key:
+        elif sim.has_key:
             obj += " | Key: ✅"
-        self.screen.blit(self.font.render(obj, True, (0, 255, 200)), (20, 95))
+        hud.set("objectives", self.font, obj, (0, 255, 200), (20, 95))
 
         # EMP info
-        emp_text = "EMP: ACTIVE ⚡" if emp_active else f"EMP: {'READY' if self.emp_available else 'USED / N/A'}"
-        self.screen.blit(self.font.render(emp_text, True, TEXT_COLOR), (20, 120))
+        emp_text = "EMP: ACTIVE ⚡" if emp_active else f"EMP: {'READY' if sim.emp_available else 'USED / N/A'}"
+        hud.set("emp", self.font, emp_text, TEXT_COLOR, (20, 120))
 
         # controls
         controls = "Controls: WASD move | SHIFT crouch | E EMP | ESC menu"
-        self.screen.blit(self.small.render(controls, True, (200, 200, 200)), (20, HEIGHT - 30))
-
-        pygame.display.flip()
+        hud.set("controls", self.small, controls, (200, 200, 200), (20, HEIGHT - 30))
+        changed += hud.draw(self.screen, self.scene if self.partial else None)
+        return changed
+
+    def draw_profiler(self):
+        """F3 overlay: rolling per-section timings (ms) and per-frame counters."""
+        rows, counts = profiler.summary()
+        lines = [f"{'section':<14}{'mean':>7}{'p50':>7}{'p99':>7}"]
+        lines += [f"{name:<14}{mean:7.2f}{p50:7.2f}{p99:7.2f}" for name, mean, p50, p99 in rows]
+        lines += [f"{name:<14}{last:>7}{mean:7.1f}" for name, last, mean in counts]
+        lines.append(f"{self.clock.get_fps():.0f} fps | F4: dump profile")
+        panel = pygame.Rect(WIDTH - 250, 10, 240, 16 * len(lines) + 8)
+        pygame.draw.rect(self.screen, (0, 0, 0), panel)
+        for i, line in enumerate(lines):
+            self.screen.blit(self.small.render(line, True, (255, 255, 0)), (panel.x + 6, panel.y + 4 + 16 * i))
+        return panel
+
+    def dump_profile(self):
+        stamp = time.strftime("%Y%m%d-%H%M%S")
+        try:
+            profiler.dump_csv(os.path.join("profiles", f"frames-{stamp}.csv"))
+            profiler.dump_trace(os.path.join("profiles", f"trace-{stamp}.json"))
+        except OSError:
+            pass
 
     def draw_center(self, text, font, color, offset_y):
-        surf = font.render(text, True, color)
+        surf = self.text.render(font, text, color)
         rect = surf.get_rect(center=(WIDTH // 2, HEIGHT // 2 + offset_y))
         self.screen.blit(surf, rect)
 
 # -------------------- ENTRY POINT --------------------
 
 if __name__ == "__main__":
-    Game().run()
+    ap = argparse.ArgumentParser(description="Pixel Bank Heist")
+    ap.add_argument("--dirty-rects", action="store_true",
+                    help="present only changed regions (slow or remote displays)")
+    ap.add_argument("--vault", type=int, metavar="SIZE",
+                    help="play one generated SIZE x SIZE vault instead of the campaign")
+    ap.add_argument("--seed", type=int, default=0, help="vault seed")
+    ap.add_argument("--startup-report", action="store_true",
+                    help="print how long each startup phase took, up to the first frame")
+    args = ap.parse_args()
+    startup.verbose = args.startup_report
+    Game(dirty_rects=args.dirty_rects,
+         vault=(args.vault, args.vault, args.seed) if args.vault else None).run()
@@ -0,0 +1,105 @@
+"""Re-run recorded heists headless (no window, no rendering).
+
+Every level attempt in the game is saved under replays/. Feed one or more
+files (or a directory – a regression corpus) to re-simulate them:
+
+    python replay.py replays/20261018-101500_L3_Medium_caught.hrpl
+    python replay.py replays/ --verify      # exit code 1 if any run diverges
+    python replay.py --check 4              # round-trip the file formats
+"""
+
+import os, sys, argparse, time, random
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import Replay, LEVELS, DIFFICULTIES, Simulation, CompiledLevel, build_level_file, map_hash
+from batch import POLICIES
+
+def replay_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(".hrpl"):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def record(map_data, level_index, diff_name, policy_name, seed):
+    """Play one heist with a batch.py policy, recording it as Game does;
+    returns (replay, finished Simulation)."""
+    settings = DIFFICULTIES[diff_name]
+    replay = Replay(map_data, level_index, diff_name, settings, seed)
+    sim = Simulation(map_data, settings)
+    policy = POLICIES[policy_name](random.Random(seed))
+    while sim.result is None:
+        inp = policy(sim)
+        replay.record(inp)
+        sim.step(inp)
+    replay.result, replay.score = sim.result, sim.gained
+    return replay, sim
+
+def check(episodes):
+    """Round-trip every campaign level through the .hlvl format and random
+    runs on it through the .hrpl format; both must re-simulate to the same
+    result and score. Returns the number of failures."""
+    failed = 0
+    for i, name in enumerate(LEVELS.names):
+        with open(os.path.join(LEVELS.directory, name)) as f:
+            rows = f.read().splitlines()
+        compiled = CompiledLevel(build_level_file(rows))
+        if list(compiled) != rows or compiled.source_hash != map_hash(rows):
+            print(f"{name}: .hlvl round trip changed the map")
+            failed += 1
+        for episode in range(episodes):
+            diff_name = list(DIFFICULTIES)[episode % len(DIFFICULTIES)]
+            policy_name = list(POLICIES)[episode % len(POLICIES)]
+            replay, sim = record(rows, i, diff_name, policy_name, seed=i * 1000 + episode)
+            copy = Replay.decode(replay.encode())
+            ok = copy.masks == replay.masks and vars(copy) == vars(replay)
+            for map_data in (rows, compiled):
+                rerun = copy.simulate(map_data)
+                ok &= rerun.result == sim.result and rerun.gained == sim.gained
+            failed += not ok
+            print(f"{name} {diff_name} {policy_name} seed={replay.seed}: {len(replay.masks)} ticks, "
+                  f"{sim.result} score={sim.gained}{'' if ok else '  <-- ROUND TRIP FAILED'}")
+    return failed
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("paths", nargs="*", help="replay files or directories")
+    ap.add_argument("--verify", action="store_true",
+                    help="fail when a re-run ends differently from the recording")
+    ap.add_argument("--check", type=int, metavar="N",
+                    help="record N random runs per level, round-trip them and the levels "
+                         "through the file formats and exit 1 on any difference")
+    args = ap.parse_args()
+    if args.check is not None:
+        sys.exit(1 if check(args.check) else 0)
+    if not args.paths:
+        ap.error("give replay files or directories, or --check N")
+
+    diverged = 0
+    for path in replay_files(args.paths):
+        try:
+            replay = Replay.load(path)
+        except ValueError as e:  # e.g. recorded under older rules
+            print(f"{os.path.basename(path)}: {e}")
+            diverged += 1
+            continue
+        start = time.perf_counter()
+        sim = replay.simulate(replay.level_map())
+        elapsed = time.perf_counter() - start
+        result = sim.result
+        same = result == replay.result and sim.gained == replay.score
+        diverged += not same
+        rate = sim.ticks / elapsed if elapsed else 0
+        print(f"{os.path.basename(path)}: level {replay.level_index + 1} {replay.diff_name} "
+              f"seed={replay.seed} | {sim.ticks} ticks in {elapsed * 1000:.0f} ms ({rate:,.0f} ticks/s) | "
+              f"{result} score={sim.gained} (recorded {replay.result} score={replay.score})"
+              f"{'' if same else '  <-- DIVERGED'}")
+
+    if args.verify and diverged:
+        sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,444 @@
+"""Authoritative heist server: many independent sessions on one fixed tick.
+
+Clients send inputs, the server runs the Simulation of every session and
+streams delta-compressed state snapshots back. Line-delimited JSON over TCP,
+or over in-process loopback pipes for load tests without a network:
+
+    python server.py --port 7777                          # serve
+    python server.py --bots 300 --duration 20             # loopback load test
+    python server.py --connect 127.0.0.1:7777 --bots 50   # bots against a server
+"""
+
+import os, sys, json, time, random, asyncio, argparse
+from collections import deque
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+from main import (LEVELS, DIFFICULTIES, FPS, DT, MAX_CATCH_UP, INPUT_BITS, VAULT_ROOM, Simulation,
+                  TickInput, generate_vault)
+from batch import RandomPolicy, percentile
+
+# emp / escape are key presses: held for one tick, however briefly they were down
+PRESS_BITS = (1 << INPUT_BITS.index("emp")) | (1 << INPUT_BITS.index("escape"))
+INPUTS = [TickInput.from_mask(m) for m in range(1 << len(INPUT_BITS))]
+INPUT_MASK = len(INPUTS) - 1  # clients may send anything; unknown bits are dropped
+MAX_VAULT = 1024  # tiles per side a client may ask for
+
+# -------------------- SNAPSHOTS --------------------
+
+def snapshot(sim):
+    """The client-visible state of a session as plain JSON values."""
+    p = sim.player
+    g = sim.guards
+    pos, facing, alert = g.pos.round(1).tolist(), g.facing.round(2).tolist(), g.alert.tolist()
+    return {
+        "tick": sim.ticks,
+        "player": [round(p.pos.x, 1), round(p.pos.y, 1)],
+        "crouch": p.crouch,
+        "invisible": p.invisible,
+        "meter": round(sim.detect_meter, 3),
+        "time_left": round(sim.time_left, 1),
+        "treasures_left": sim.treasures_left,
+        "has_key": sim.has_key,
+        "emp": sim.emp_active,
+        "emp_available": sim.emp_available,
+        "taken": {f"{x},{y}": 1 for x, y in sim.taken},
+        "guards": {str(gid): pos[i] + facing[i] + [alert[i]] for i, gid in enumerate(sim.guard_ids)},
+    }
+
+def delta(old, new):
+    """What changed from `old` to `new`; nested dicts recurse, removed keys are None."""
+    out = {}
+    for k, v in new.items():
+        before = old.get(k)
+        if isinstance(v, dict) and isinstance(before, dict):
+            d = delta(before, v)
+            if d:
+                out[k] = d
+        elif v != before or k not in old:
+            out[k] = v
+    for k in old.keys() - new.keys():
+        out[k] = None
+    return out
+
+def apply_delta(state, d):
+    for k, v in d.items():
+        if v is None:
+            state.pop(k, None)
+        elif isinstance(v, dict) and isinstance(state.get(k), dict):
+            apply_delta(state[k], v)
+        else:
+            state[k] = v
+    return state
+
+# -------------------- TRANSPORT --------------------
+
+class StreamConnection:
+    """One JSON message per line over an asyncio stream (TCP)."""
+
+    def __init__(self, reader, writer):
+        self.reader = reader
+        self.writer = writer
+
+    def send(self, msg):
+        line = json.dumps(msg, separators=(",", ":")).encode() + b"\n"
+        self.writer.write(line)
+        return len(line)
+
+    def congested(self):
+        return self.writer.transport.get_write_buffer_size() > 1 << 16
+
+    async def recv(self):
+        line = await self.reader.readline()
+        return json.loads(line) if line else None
+
+    def close(self):
+        self.writer.close()
+
+class LoopbackConnection:
+    """In-process end of a loopback pipe; messages are encoded like on TCP."""
+
+    def __init__(self, inbox, outbox):
+        self.inbox = inbox
+        self.outbox = outbox
+
+    @classmethod
+    def pair(cls):
+        a, b = asyncio.Queue(), asyncio.Queue()
+        return cls(a, b), cls(b, a)
+
+    def send(self, msg):
+        line = json.dumps(msg, separators=(",", ":")).encode()
+        self.outbox.put_nowait(line)
+        return len(line) + 1
+
+    def congested(self):
+        return self.outbox.qsize() > 64
+
+    async def recv(self):
+        line = await self.inbox.get()
+        return json.loads(line) if line else None
+
+    def close(self):
+        self.outbox.put_nowait(b"")
+
+# -------------------- SERVER --------------------
+
+class Session:
+    """One level instance and the client that plays it."""
+
+    def __init__(self, sid, conn, sim, level, difficulty):
+        self.id = sid
+        self.conn = conn
+        self.sim = sim
+        self.level = level
+        self.difficulty = difficulty
+        self.held = 0
+        self.pressed = 0
+        self.sent = {}  # last snapshot the client has; deltas are taken against it
+
+    def set_input(self, mask):
+        mask &= INPUT_MASK
+        self.held = mask & ~PRESS_BITS
+        self.pressed |= mask & PRESS_BITS
+
+    def step(self):
+        self.sim.step(INPUTS[self.held | self.pressed])
+        self.pressed = 0
+
+    def send_snapshot(self):
+        """Send what changed since the last snapshot; returns bytes sent."""
+        if self.conn.congested():
+            return 0  # slow client: skip, the next delta covers both
+        state = snapshot(self.sim)
+        n = self.conn.send({"t": "delta", "d": delta(self.sent, state)})
+        self.sent = state
+        return n
+
+class HeistServer:
+    """Runs every session on one shared fixed-tick scheduler.
+
+    Each tick steps all sessions back to back, then sends snapshots every
+    `snapshot_every` ticks. `busy` is the time one tick took and `late`
+    how far its start slipped behind schedule; metrics() turns them into
+    the number of sessions one core could keep at FPS.
+    """
+
+    def __init__(self, snapshot_every=2, window=600, max_vault=MAX_VAULT):
+        self.snapshot_every = snapshot_every
+        self.max_vault = max_vault
+        self.sessions = {}
+        self.next_id = 1
+        self.ticks = 0
+        self.busy = deque(maxlen=window)  # (seconds, sessions stepped)
+        self.late = deque(maxlen=window)
+        self.dropped = 0
+        self.finished = 0
+        self.failed = 0
+        self.session_ticks = 0
+        self.sent_bytes = 0
+
+    def parse_vault(self, value):
+        """(cols, rows, seed) of a vault a client asked for, or None when the
+        request is malformed or bigger than `max_vault` tiles per side."""
+        if not isinstance(value, list) or len(value) not in (2, 3):
+            return None
+        if not all(type(v) is int for v in value):
+            return None
+        cols, rows, seed = (value + [0])[:3]
+        smallest = 2 * VAULT_ROOM + 1
+        if not (smallest <= cols <= self.max_vault and smallest <= rows <= self.max_vault):
+            return None
+        return cols, rows, seed
+
+    def open_level(self, level, vault=None):
+        if vault:
+            return generate_vault(*vault)
+        return LEVELS[level]
+
+    async def join(self, conn, msg):
+        difficulty = msg.get("difficulty", "Medium")
+        level = int(msg.get("level", 1)) - 1
+        vault = self.parse_vault(msg["vault"]) if msg.get("vault") else None
+        if difficulty not in DIFFICULTIES or not (vault or 0 <= level < len(LEVELS)) \
+                or (msg.get("vault") and not vault):
+            conn.send({"t": "error", "error": "unknown level, vault or difficulty"})
+            return None
+        if vault:
+            # generating a vault takes a while: keep the shared tick running meanwhile
+            loop = asyncio.get_running_loop()
+            sim = await loop.run_in_executor(
+                None, lambda: Simulation(self.open_level(level, vault), DIFFICULTIES[difficulty]))
+        else:
+            sim = Simulation(self.open_level(level), DIFFICULTIES[difficulty])
+        session = Session(self.next_id, conn, sim, level, difficulty)
+        self.next_id += 1
+        self.sessions[session.id] = session
+        session.sent = snapshot(sim)
+        conn.send({"t": "welcome", "session": session.id, "fps": FPS,
+                   "snapshot_every": self.snapshot_every, "state": session.sent})
+        return session
+
+    def leave(self, session):
+        self.sessions.pop(session.id, None)
+
+    async def serve_client(self, conn):
+        """Handle one client until it disconnects; it may play many sessions."""
+        session = None
+        try:
+            while True:
+                msg = await conn.recv()
+                if msg is None:
+                    break
+                if not isinstance(msg, dict):
+                    raise ValueError("message is not a JSON object")
+                kind = msg.get("t")
+                if kind == "input" and session is not None:
+                    session.set_input(int(msg["mask"]))
+                elif kind == "join":
+                    if session is not None:
+                        self.leave(session)
+                    session = await self.join(conn, msg)
+        except (ConnectionError, ValueError, KeyError, TypeError):
+            pass  # malformed or broken client: drop it
+        finally:
+            if session is not None:
+                self.leave(session)
+            conn.close()
+
+    def tick(self):
+        send = self.ticks % self.snapshot_every == 0
+        for session in list(self.sessions.values()):
+            try:
+                session.step()
+            except Exception as e:
+                # a broken session must not stop everyone else's tick
+                print(f"session {session.id} failed: {e!r}", file=sys.stderr)
+                session.conn.send({"t": "error", "error": "session failed"})
+                self.leave(session)
+                self.failed += 1
+                continue
+            sim = session.sim
+            if sim.result is not None:
+                self.sent_bytes += session.send_snapshot()
+                session.conn.send({"t": "end", "result": sim.result, "score": sim.gained,
+                                   "ticks": sim.ticks})
+                self.leave(session)
+                self.finished += 1
+            elif send:
+                self.sent_bytes += session.send_snapshot()
+        self.session_ticks += len(self.sessions)
+        self.ticks += 1
+
+    async def run(self, stop):
+        loop = asyncio.get_running_loop()
+        next_tick = loop.time()
+        while not stop.is_set():
+            now = loop.time()
+            if now < next_tick:
+                await asyncio.sleep(next_tick - now)
+                continue
+            behind = int((now - next_tick) / DT)
+            if behind >= MAX_CATCH_UP:
+                # overloaded: drop the backlog rather than spiral
+                self.dropped += behind
+                next_tick += behind * DT
+            self.late.append(now - next_tick)
+            start = time.perf_counter()
+            count = len(self.sessions)
+            self.tick()
+            self.busy.append((time.perf_counter() - start, count))
+            next_tick += DT
+            await asyncio.sleep(0)  # let clients' inputs in between ticks
+
+    def metrics(self):
+        busy = [b for b, _ in self.busy]
+        stepped = sum(n for _, n in self.busy)
+        per_session = sum(busy) / stepped if stepped else 0.0
+        late = list(self.late)
+        return {
+            "sessions": len(self.sessions),
+            "finished": self.finished,
+            "failed": self.failed,
+            "tick_ms": {"mean": sum(busy) / len(busy) * 1000 if busy else 0.0,
+                        "p50": percentile(busy, 50) * 1000, "p99": percentile(busy, 99) * 1000},
+            "late_ms": {"p50": percentile(late, 50) * 1000, "p99": percentile(late, 99) * 1000},
+            "session_us": per_session * 1e6,
+            "sessions_per_core": int(DT / per_session) if per_session else 0,
+            "session_bytes_per_s": self.sent_bytes / self.session_ticks * FPS if self.session_ticks else 0.0,
+            "dropped_ticks": self.dropped,
+        }
+
+# -------------------- CLIENTS --------------------
+
+class HeistClient:
+    """Keeps a copy of the session state from the server's snapshots."""
+
+    def __init__(self, conn):
+        self.conn = conn
+        self.state = None
+        self.mask = 0
+
+    def join(self, level=1, difficulty="Medium", vault=None):
+        self.state = None
+        self.conn.send({"t": "join", "level": level, "difficulty": difficulty, "vault": vault})
+
+    def send_input(self, inp):
+        mask = inp.mask()
+        if mask != self.mask:
+            self.conn.send({"t": "input", "mask": mask})
+            self.mask = mask
+
+    async def next_message(self):
+        """The next server message, with snapshots already applied to `state`."""
+        msg = await self.conn.recv()
+        if msg is None:
+            return None
+        kind = msg["t"]
+        if kind == "welcome":
+            self.state = msg["state"]
+            self.mask = 0
+        elif kind == "delta":
+            apply_delta(self.state, msg["d"])
+        return msg
+
+async def bot(conn, rnd, levels, difficulty, stats, stop):
+    """Load generator: plays heist after heist with a RandomPolicy."""
+    client = HeistClient(conn)
+    while not stop.is_set():
+        client.join(rnd.choice(levels), difficulty)
+        policy = RandomPolicy(rnd)
+        while True:
+            msg = await client.next_message()
+            if msg is None:
+                return
+            if msg["t"] == "end":
+                stats[msg["result"]] = stats.get(msg["result"], 0) + 1
+                break
+            if msg["t"] == "error":
+                return
+            client.send_input(policy(client.state))
+    conn.close()
+
+# -------------------- CLI --------------------
+
+def print_metrics(server, elapsed, cpu):
+    m = server.metrics()
+    print(f"[{elapsed:6.1f}s] sessions {m['sessions']:>4}  finished {m['finished']:>5} | "
+          f"tick mean {m['tick_ms']['mean']:.2f} ms  p50 {m['tick_ms']['p50']:.2f}  "
+          f"p99 {m['tick_ms']['p99']:.2f} | late p99 {m['late_ms']['p99']:.2f} ms | "
+          f"{m['session_us']:.0f} us/session-tick -> {m['sessions_per_core']} sessions/core | "
+          f"{m['session_bytes_per_s'] / 1024:.1f} KiB/s per session | "
+          f"cpu {cpu * 100:.0f}% | dropped {m['dropped_ticks']}")
+    return m
+
+async def main_async(args):
+    stop = asyncio.Event()
+    rnd = random.Random(args.seed)
+    levels = [args.level] if args.level else list(range(1, len(LEVELS) + 1))
+    stats = {}
+    server, conns, tasks = None, [], []
+
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        for _ in range(args.bots):
+            conns.append(StreamConnection(*await asyncio.open_connection(host, int(port))))
+    else:
+        server = HeistServer(args.snapshot_every)
+        tasks.append(asyncio.create_task(server.run(stop)))
+        if args.port:
+            tcp = await asyncio.start_server(
+                lambda r, w: server.serve_client(StreamConnection(r, w)), args.host, args.port)
+            print(f"serving on {args.host}:{args.port}")
+        for _ in range(args.bots):
+            server_end, client_end = LoopbackConnection.pair()
+            tasks.append(asyncio.create_task(server.serve_client(server_end)))
+            conns.append(client_end)
+    tasks += [asyncio.create_task(bot(c, random.Random(rnd.random()), levels, args.difficulty, stats, stop))
+              for c in conns]
+
+    start, cpu_start = time.perf_counter(), time.process_time()
+    deadline = start + args.duration if args.duration else None
+    metrics = None
+    try:
+        while deadline is None or time.perf_counter() < deadline:
+            await asyncio.sleep(args.report_every)
+            if server:
+                elapsed = time.perf_counter() - start
+                cpu = (time.process_time() - cpu_start) / elapsed
+                metrics = print_metrics(server, elapsed, cpu)
+    finally:
+        stop.set()
+        for c in conns:
+            c.close()
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+    if stats:
+        print("results: " + "  ".join(f"{k} {v}" for k, v in sorted(stats.items())))
+    if args.json and metrics:
+        print(json.dumps(metrics, indent=2))
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--host", default="127.0.0.1")
+    ap.add_argument("--port", type=int, help="accept TCP clients on this port")
+    ap.add_argument("--connect", metavar="HOST:PORT", help="run the bots against a remote server")
+    ap.add_argument("--bots", type=int, default=0, help="load-generator clients")
+    ap.add_argument("--level", type=int, help=f"level the bots play, 1..{len(LEVELS)} (default: all)")
+    ap.add_argument("--difficulty", default="Medium", choices=list(DIFFICULTIES))
+    ap.add_argument("--duration", type=float, help="seconds to run (default: forever)")
+    ap.add_argument("--snapshot-every", type=int, default=2, help="ticks between snapshots")
+    ap.add_argument("--report-every", type=float, default=2.0, help="seconds between metric lines")
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--json", action="store_true", help="print the final metrics as JSON")
+    args = ap.parse_args()
+    if not (args.port or args.bots):
+        ap.error("nothing to do: give --port and/or --bots")
+    try:
+        asyncio.run(main_async(args))
+    except KeyboardInterrupt:
+        sys.exit(130)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,535 @@
+"""Vectorized heist environments: N copies of a level stepped in lockstep.
+
+A Gymnasium-style vector env over the Simulation rules for training stealth
+agents. Every player, guard, detection meter and timer lives in a NumPy
+array with one row per environment, so step() advances all of them with
+array operations; the only Python loops run over guards and raycast steps,
+never over environments. Finished heists reset automatically.
+
+    from vecenv import HeistVecEnv
+    env = HeistVecEnv(level=3, num_envs=4096, difficulty="Hard")
+    obs, info = env.reset()
+    obs, reward, terminated, truncated, info = env.step(actions)  # TickInput masks
+
+    python vecenv.py --level 8 --envs 4096        # env-steps per second
+    python vecenv.py --level 8 --check 64         # tick-for-tick against Simulation
+"""
+
+import os, time, random, argparse
+
+os.environ.setdefault("PYGAME_HIDE_SUPPORT_PROMPT", "1")
+
+import numpy as np
+from main import (LEVELS, DIFFICULTIES, TILE, DT, PLAYER_SPEED, CROUCH_SPEED, INPUT_BITS,
+                  PICKUPS, PATROL_TURNS, Simulation, TickInput, TileGrid, NavGrid, SoundMap,
+                  bfs_distances, in_cone)
+
+# info["result"] codes
+RUNNING, CAUGHT, TIMEOUT, ESCAPED, QUIT = range(5)
+RESULTS = (None, "caught", "timeout", "escaped", "quit")
+
+PAD = 8  # open tiles around the level so rays and guards may leave the map
+HALF = 11  # Player.size // 2
+
+def _round(v):
+    """Round half away from zero, as pygame.Rect does with float coordinates."""
+    return np.where(v >= 0, np.floor(v + 0.5), np.ceil(v - 0.5)).astype(np.int64)
+
+# -------------------- LEVEL TABLES --------------------
+
+class LevelTables:
+    """Everything about one level that the environments share, for both
+    door states (0 = shut, 1 = open after the key).
+
+    Guards chase along NavGrid flow fields and hear through SoundMap fields;
+    here both are tabulated for every tile once, so the lockstep step only
+    does lookups: `nav[doors, goal, tile]` is the next tile towards `goal`
+    (-1: head straight for it) and `sound[doors, tile]` / `sight[doors,
+    tile]` the SoundMap field and in-sight mask around a noise source.
+    """
+
+    def __init__(self, sim):
+        grid = sim.grid
+        self.cols, self.rows = grid.cols, grid.rows
+        shut = np.frombuffer(bytes(grid.cells), np.uint8).reshape(self.rows, self.cols)
+        opened = shut.copy()
+        for x, y in grid.doors:
+            opened[y, x] = 0
+        self.grid = np.stack([shut, opened])
+        self.solid = np.pad(self.grid, ((0, 0), (PAD, PAD), (PAD, PAD))).astype(bool)
+        door_states = (0, 1) if grid.doors else (0,)
+
+        n = self.cols * self.rows
+        self.nav = np.full((2, n, n), -1, np.int32)
+        reach = SoundMap(grid).reach
+        self.reach = reach
+        self.sound = np.full((2, n, 2 * reach + 1, 2 * reach + 1), np.inf, np.float32)
+        self.sight = np.zeros((2, n, 2 * reach + 1, 2 * reach + 1), bool)
+        for doors in door_states:
+            g = TileGrid([])
+            g.cols, g.rows = self.cols, self.rows
+            g.cells = bytearray(self.grid[doors].tobytes())
+            self.fill_nav(self.nav[doors], g)
+            sound = SoundMap(g, cache_size=0)
+            for i in range(n):
+                self.sound[doors, i], self.sight[doors, i] = sound.entry((i % self.cols, i // self.cols))
+        if len(door_states) == 1:
+            self.nav[1], self.sound[1], self.sight[1] = self.nav[0], self.sound[0], self.sight[0]
+
+    def fill_nav(self, table, grid):
+        """NavGrid.next_waypoint() for every (goal, tile) pair."""
+        cols = self.cols
+        for goal in range(cols * self.rows):
+            field = bfs_distances(grid, (goal % cols, goal // cols), NavGrid.RADIUS)
+            for tile, here in field.items():
+                if tile == goal:
+                    continue
+                cx, cy = tile % cols, tile // cols
+                for nx, ny in ((cx + 1, cy), (cx - 1, cy), (cx, cy + 1), (cx, cy - 1)):
+                    if 0 <= nx < cols and field.get(ny * cols + nx) == here - 1:
+                        table[goal, tile] = ny * cols + nx
+                        break
+
+    def blocked(self, doors, tx, ty):
+        """TileGrid.blocked() per ray; outside the map nothing blocks."""
+        h, w = self.solid.shape[1:]
+        return self.solid[doors, np.clip(ty + PAD, 0, h - 1), np.clip(tx + PAD, 0, w - 1)]
+
+    def clear(self, doors, x0, y0, x1, y1):
+        """line_of_sight() for many segments at once: the same grid traversal
+        (ray_hit), stepped in lockstep for every ray still in flight."""
+        n = len(x0)
+        tx = (x0 // TILE).astype(np.int64)
+        ty = (y0 // TILE).astype(np.int64)
+        clear = np.zeros(n, bool)
+        live = ~self.blocked(doors, tx, ty)
+
+        dx, dy = x1 - x0, y1 - y0
+        step_x = np.where(dx > 0, 1, -1)
+        step_y = np.where(dy > 0, 1, -1)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            edge_x = np.where(dx > 0, (tx + 1) * TILE, tx * TILE)
+            edge_y = np.where(dy > 0, (ty + 1) * TILE, ty * TILE)
+            t_max_x = np.where(dx != 0, (edge_x - x0) / dx, np.inf)
+            t_delta_x = np.where(dx != 0, TILE / np.abs(dx), np.inf)
+            t_max_y = np.where(dy != 0, (edge_y - y0) / dy, np.inf)
+            t_delta_y = np.where(dy != 0, TILE / np.abs(dy), np.inf)
+
+        rays = np.flatnonzero(live)
+        doors, tx, ty, step_x, step_y = doors[rays], tx[rays], ty[rays], step_x[rays], step_y[rays]
+        t_max_x, t_delta_x, t_max_y, t_delta_y = t_max_x[rays], t_delta_x[rays], t_max_y[rays], t_delta_y[rays]
+        while len(rays):
+            xs = t_max_x < t_max_y
+            ys = t_max_y < t_max_x
+            t = np.where(ys, t_max_y, t_max_x)
+            out = t > 1
+            corner = ~xs & ~ys & ~out
+            hit = corner & (self.blocked(doors, tx + step_x, ty) | self.blocked(doors, tx, ty + step_y))
+            move_x = (xs | corner) & ~out & ~hit
+            move_y = (ys | corner) & ~out & ~hit
+            tx = tx + np.where(move_x, step_x, 0)
+            ty = ty + np.where(move_y, step_y, 0)
+            t_max_x = np.where(move_x, t_max_x + t_delta_x, t_max_x)
+            t_max_y = np.where(move_y, t_max_y + t_delta_y, t_max_y)
+            hit |= ~out & ~hit & self.blocked(doors, tx, ty)
+            clear[rays[out]] = True
+            keep = ~out & ~hit
+            rays, doors, tx, ty, step_x, step_y = rays[keep], doors[keep], tx[keep], ty[keep], step_x[keep], step_y[keep]
+            t_max_x, t_delta_x = t_max_x[keep], t_delta_x[keep]
+            t_max_y, t_delta_y = t_max_y[keep], t_delta_y[keep]
+        return clear
+
+# -------------------- VECTOR ENV --------------------
+
+class HeistVecEnv:
+    """`num_envs` independent heists of one level, stepped in lockstep.
+
+    Actions are TickInput masks (INPUT_BITS), one per environment. Every
+    step returns observations (a dict of batched arrays), the reward (the
+    level score on escaping, else 0), `terminated` (caught, timeout, escaped
+    or quit), `truncated` (hit `max_ticks`) and an info dict: the `result`
+    code and `score` of every environment, plus `final_observation` / `_final`
+    for the ones that finished and were reset within this step.
+
+    The rules are Simulation's, so only levels whose chunks all fit the
+    active window (every campaign level) are supported: there are no chunk
+    loads or parked guards to mirror.
+    """
+
+    def __init__(self, level=1, num_envs=1024, difficulty="Medium", settings=None, max_ticks=None):
+        map_data = LEVELS[level - 1] if isinstance(level, int) else level
+        self.settings = dict(settings or DIFFICULTIES[difficulty])
+        template = Simulation(map_data, self.settings)
+        if not template.level.fits_window:
+            raise ValueError("vector envs need a level that fits the active chunk window")
+        self.num_envs = n = num_envs
+        self.max_ticks = max_ticks
+        self.tables = LevelTables(template)
+        self.time_limit = template.time_limit
+        self.detect = self.settings["detect"]
+        self.exit_rect = tuple(template.exit_rect) if template.exit_rect else None
+
+        # initial state of one heist, copied into environments on reset
+        g = template.guards
+        self.n_guards = len(g)
+        self.guard_speed = g.speed.copy()
+        self.guard_vision = g.vision.copy()
+        self.guard_start, self.guard_end, self.guard_pattern = g.start.copy(), g.end.copy(), g.pattern.copy()
+        self.init_guards = (g.pos.copy(), g.vel.copy(), g.facing.copy())
+        self.init_pos = np.array(template.player.pos)
+        self.init_rect = np.array(template.player.rect.topleft)
+
+        ents = template.entities
+        slots = sorted((s for s, k in enumerate(ents.kind) if k in PICKUPS), key=lambda s: ents.kind[s])
+        self.pickup_kind = np.array([ents.kind[s] for s in slots])
+        self.pickup_rect = np.array([tuple(ents.rect[s]) for s in slots], np.int64).reshape(-1, 4)
+        self.treasures = int((self.pickup_kind == "T").sum())
+
+        self.pos = np.zeros((n, 2))
+        self.vel = np.zeros((n, 2))
+        self.rect = np.zeros((n, 2), np.int64)
+        self.crouch = np.zeros(n, bool)
+        self.player = {"speed_boost": np.ones(n), "speed_end": np.zeros(n),
+                       "invisible": np.zeros(n, bool), "invis_end": np.zeros(n)}
+        self.ticks = np.zeros(n, np.int64)
+        self.meter = np.zeros(n)
+        self.emp_available = np.zeros(n, bool)
+        self.emp_end = np.zeros(n)
+        self.has_key = np.zeros(n, bool)
+        self.taken = np.zeros((n, len(self.pickup_kind)), bool)
+        self.treasures_left = np.zeros(n, np.int64)
+        shape = (n, self.n_guards)
+        self.gpos, self.gvel, self.gfacing = np.zeros(shape + (2,)), np.zeros(shape + (2,)), np.zeros(shape + (2,))
+        self.alert = np.zeros(shape, bool)
+        self.alert_timer = np.zeros(shape)
+        self.reset_envs(np.ones(n, bool))
+
+    @property
+    def observation_spec(self):
+        """{name: (shape, dtype)} of one environment's observation."""
+        t = self.tables
+        return {"grid": ((t.rows, t.cols), np.uint8), "player": ((2,), np.float32),
+                "guards": ((self.n_guards, 4), np.float32), "meter": ((), np.float32),
+                "time_left": ((), np.float32), "treasures_left": ((), np.int16), "has_key": ((), bool)}
+
+    # ----------------- API -----------------
+
+    def reset(self, seed=None, options=None):
+        """Restart every heist. The rules are deterministic, so `seed` only
+        exists for API compatibility."""
+        self.reset_envs(np.ones(self.num_envs, bool))
+        return self.observe(), {}
+
+    def step(self, actions):
+        a = np.asarray(actions, np.int64)
+        bit = {name: (a >> i & 1).astype(bool) for i, name in enumerate(INPUT_BITS)}
+        n = self.num_envs
+        emp_active = self.ticks * DT < self.emp_end  # as of the previous tick
+        self.ticks += 1
+        now = self.ticks * DT
+        result = np.where(bit["escape"], QUIT, RUNNING).astype(np.int8)
+
+        fire = bit["emp"] & self.emp_available
+        self.emp_available &= ~fire
+        self.emp_end[fire] = now[fire] + 3
+        self.emit_sound(fire, 120)
+
+        self.crouch = bit["crouch"]
+        base = np.where(self.crouch, CROUCH_SPEED, PLAYER_SPEED)
+        dx = (bit["right"].astype(np.int64) - bit["left"]) * base
+        dy = (bit["down"].astype(np.int64) - bit["up"]) * base
+        diag = (dx != 0) & (dy != 0)
+        dx[diag] *= 0.7071
+        dy[diag] *= 0.7071
+        prev = self.pos.copy()
+        self.move_players(dx, dy, now)
+        step = self.pos - prev
+        self.emit_sound(~self.crouch & (np.sqrt(step[:, 0] ** 2 + step[:, 1] ** 2) > 0.5), 130)
+
+        chasing = self.alert.copy()
+        self.chase(chasing)
+        self.patrol(~chasing)
+        seen = self.spot(emp_active | self.player["invisible"])
+
+        self.meter = np.where(seen, self.meter + np.where(self.crouch, 0.8, 1.8) * DT,
+                              np.maximum(0.0, self.meter - 1.0 * DT))
+        result[self.meter >= self.detect] = CAUGHT
+
+        self.pick_up(now)
+        result[now > self.time_limit] = TIMEOUT
+        score = np.zeros(n)
+        if self.exit_rect:
+            ex, ey, ew, eh = self.exit_rect
+            rx, ry = self.rect[:, 0], self.rect[:, 1]
+            out = (self.treasures_left == 0) & (rx < ex + ew) & (ry < ey + eh) & (rx + 22 > ex) & (ry + 22 > ey)
+            remaining = np.maximum(0, self.time_limit - now)
+            score = np.where(out, np.maximum(0, np.trunc(1000 + remaining * 5 - self.meter * 50)), 0.0)
+            result[out] = ESCAPED
+
+        terminated = result != RUNNING
+        truncated = ~terminated & (self.ticks >= self.max_ticks) if self.max_ticks else np.zeros(n, bool)
+        info = {"result": result, "score": score}
+        done = terminated | truncated
+        if done.any():
+            info["final_observation"] = {k: v[done] for k, v in self.observe().items()}
+            info["_final"] = done
+            self.reset_envs(done)
+        return self.observe(), score.astype(np.float32), terminated, truncated, info
+
+    def observe(self):
+        doors = self.has_key.astype(np.int64)
+        return {
+            "grid": self.tables.grid[doors],
+            "player": self.pos.astype(np.float32),
+            "guards": np.concatenate([self.gpos, self.gfacing], axis=2).astype(np.float32),
+            "meter": self.meter.astype(np.float32),
+            "time_left": np.maximum(0.0, self.time_limit - self.ticks * DT).astype(np.float32),
+            "treasures_left": self.treasures_left.astype(np.int16),
+            "has_key": self.has_key.copy(),
+        }
+
+    def reset_envs(self, mask):
+        self.pos[mask] = self.init_pos
+        self.vel[mask] = 0.0
+        self.rect[mask] = self.init_rect
+        self.crouch[mask] = False
+        self.player["speed_boost"][mask] = 1.0
+        self.player["speed_end"][mask] = 0.0
+        self.player["invisible"][mask] = False
+        self.player["invis_end"][mask] = 0.0
+        self.ticks[mask] = 0
+        self.meter[mask] = 0.0
+        self.emp_available[mask] = self.settings["emp"]
+        self.emp_end[mask] = 0.0
+        self.has_key[mask] = False
+        self.taken[mask] = False
+        self.treasures_left[mask] = self.treasures
+        pos, vel, facing = self.init_guards
+        self.gpos[mask], self.gvel[mask], self.gfacing[mask] = pos, vel, facing
+        self.alert[mask] = False
+        self.alert_timer[mask] = 0.0
+
+    # ----------------- RULES -----------------
+
+    def move_players(self, dx, dy, now):
+        """Player.move() for every environment (walls = solid tiles)."""
+        p = self.player
+        p["speed_boost"][now > p["speed_end"]] = 1.0
+        p["invisible"][now > p["invis_end"]] = False
+        self.vel = self.vel * 0.6 + np.stack([dx, dy], axis=1) * p["speed_boost"][:, None] * 0.4
+
+        doors = self.has_key.astype(np.int64)
+        x, y = self.rect[:, 0], self.rect[:, 1]
+        tx = _round(x + HALF + self.vel[:, 0]) - HALF
+        self.pos[:, 0] += np.where(self.hits_wall(doors, tx, y), 0.0, self.vel[:, 0])
+        ty = _round(y + HALF + self.vel[:, 1]) - HALF
+        self.pos[:, 1] += np.where(self.hits_wall(doors, x, ty), 0.0, self.vel[:, 1])
+        self.rect = _round(self.pos) - HALF
+
+    def hits_wall(self, doors, x, y):
+        """Does the 22x22 player rect at (x, y) overlap a solid tile?"""
+        t = self.tables
+        x0, y0, x1, y1 = x // TILE, y // TILE, (x + 21) // TILE, (y + 21) // TILE
+        return t.blocked(doors, x0, y0) | t.blocked(doors, x1, y0) | t.blocked(doors, x0, y1) | t.blocked(doors, x1, y1)
+
+    def emit_sound(self, mask, radius):
+        """Simulation.emit_sound() in the environments where `mask` is set."""
+        envs = np.flatnonzero(mask)
+        if not len(envs) or not self.n_guards:
+            return
+        t = self.tables
+        src = (self.pos[envs] // TILE).astype(np.int64)
+        doors = self.has_key[envs].astype(np.int64)
+        field = t.sound[doors, src[:, 1] * t.cols + src[:, 0]]
+        sight = t.sight[doors, src[:, 1] * t.cols + src[:, 0]]
+        local = (self.gpos[envs] // TILE).astype(np.int64) - (src - t.reach)[:, None, :]
+        size = 2 * t.reach + 1
+        inside = ((local >= 0) & (local < size)).all(axis=2)
+        local = np.clip(local, 0, size - 1)
+        rows = np.arange(len(envs))[:, None]
+        d = self.gpos[envs] - self.pos[envs][:, None, :]
+        straight = np.sqrt(d[..., 0] * d[..., 0] + d[..., 1] * d[..., 1])
+        seen = sight[rows, local[..., 1], local[..., 0]]
+        path = field[rows, local[..., 1], local[..., 0]].astype(float)
+        dist = np.where(inside, np.where(seen, straight, path), np.inf)
+        heard = ~self.alert[envs] & (dist <= radius)
+        self.alert[envs] |= heard
+        self.alert_timer[envs] = np.where(heard, 2.5, self.alert_timer[envs])
+
+    def chase(self, mask):
+        """GuardBatch.chase() for every alert guard: straight at the player
+        when in sight, else along the nav table."""
+        env, g = np.nonzero(mask)
+        if not len(env):
+            return
+        t = self.tables
+        gp = self.gpos[env, g]
+        pp = self.pos[env]
+        doors = self.has_key[env].astype(np.int64)
+        target = pp.copy()
+        blind = ~t.clear(doors, gp[:, 0], gp[:, 1], pp[:, 0], pp[:, 1])
+        if blind.any():
+            goal = (pp[blind] // TILE).astype(np.int64)
+            here = (gp[blind] // TILE).astype(np.int64)
+            on_map = (here[:, 0] >= 0) & (here[:, 0] < t.cols) & (here[:, 1] >= 0) & (here[:, 1] < t.rows)
+            here_i = np.where(on_map, here[:, 1] * t.cols + here[:, 0], 0)
+            nxt = np.where(on_map, t.nav[doors[blind], goal[:, 1] * t.cols + goal[:, 0], here_i], -1)
+            way = nxt >= 0
+            rows = np.flatnonzero(blind)[way]
+            target[rows, 0] = nxt[way] % t.cols * TILE + TILE / 2
+            target[rows, 1] = nxt[way] // t.cols * TILE + TILE / 2
+        diff = target - gp
+        l2 = diff[:, 0] * diff[:, 0] + diff[:, 1] * diff[:, 1]
+        turn = l2 > 1
+        direction = diff[turn] / np.sqrt(l2[turn])[:, None]
+        self.gvel[env[turn], g[turn]] = direction * (self.guard_speed[g[turn]] * 1.6)[:, None]
+        self.gfacing[env[turn], g[turn]] = direction
+        self.gpos[env, g] += self.gvel[env, g]
+        self.alert_timer[env, g] -= DT
+        self.alert[env, g] = self.alert_timer[env, g] > 0
+
+    def patrol(self, mask):
+        """GuardBatch.patrol() for every guard that is not chasing."""
+        env, g = np.nonzero(mask)
+        if not len(env):
+            return
+        heading = self.gvel[env, g]  # before this tick
+        pos, vel, facing = self.gpos[env, g] + heading, heading.copy(), self.gfacing[env, g]
+        speed, pattern = self.guard_speed[g], self.guard_pattern[g]
+        moved = pos.copy()
+        done = np.zeros(len(env), bool)
+        for kind, turns in PATROL_TURNS.items():
+            for axis, at_end, sign, new_vel, new_facing in turns:
+                bound = (self.guard_end if at_end else self.guard_start)[g, axis]
+                hit = (pattern == kind) & ~done
+                hit &= moved[:, axis] >= bound if at_end else moved[:, axis] <= bound
+                if sign:
+                    hit &= sign * heading[:, axis] > 0
+                done |= hit
+                pos[hit, axis] = bound[hit]
+                for k, v in enumerate(new_vel):
+                    if v is not None:
+                        vel[hit, k] = v * speed[hit]
+                facing[hit] = new_facing
+        self.gpos[env, g], self.gvel[env, g], self.gfacing[env, g] = pos, vel, facing
+
+    def spot(self, blind):
+        """GuardBatch.sees() plus the alerts it raises; returns which
+        environments' players were seen by any guard."""
+        n, G = self.num_envs, self.n_guards
+        if not G:
+            return np.zeros(n, bool)
+        vec = self.pos[:, None, :] - self.gpos
+        cand = ~blind[:, None] & in_cone(vec[..., 0], vec[..., 1], self.gfacing[..., 0], self.gfacing[..., 1],
+                                         self.guard_vision)
+        seeing = np.zeros((n, G), bool)
+        env, g = np.nonzero(cand)
+        if len(env):
+            gp, pp = self.gpos[env, g], self.pos[env]
+            seeing[env, g] = self.tables.clear(self.has_key[env].astype(np.int64),
+                                               gp[:, 0], gp[:, 1], pp[:, 0], pp[:, 1])
+
+        # guards raise the alarm in order, so one already alerted by a
+        # neighbour this tick doesn't reset its own timer
+        for i in range(G):
+            new = np.flatnonzero(seeing[:, i] & ~self.alert[:, i])
+            if not len(new):
+                continue
+            self.alert[new, i] = True
+            self.alert_timer[new, i] = 2.5
+            d = self.gpos[new] - self.gpos[new, i][:, None, :]
+            near = d[..., 0] * d[..., 0] + d[..., 1] * d[..., 1] < 120 * 120
+            near[:, i] = False
+            self.alert[new] |= near
+            self.alert_timer[new] = np.where(near, 3.0, self.alert_timer[new])
+        return seeing.any(axis=1)
+
+    def pick_up(self, now):
+        """Pickups under the player rect, with PICKUPS' effects."""
+        if not len(self.pickup_kind):
+            return
+        r = self.pickup_rect
+        rx, ry = self.rect[:, 0:1], self.rect[:, 1:2]
+        hits = ~self.taken & (rx < r[:, 0] + r[:, 2]) & (ry < r[:, 1] + r[:, 3]) & (rx + 22 > r[:, 0]) & (ry + 22 > r[:, 1])
+        if not hits.any():
+            return
+        self.taken |= hits
+        kind = self.pickup_kind
+        self.treasures_left -= hits[:, kind == "T"].sum(axis=1)
+        self.has_key |= hits[:, kind == "K"].any(axis=1)
+        for ch, powerup in PICKUPS.items():
+            if "effect" not in powerup:
+                continue
+            got = hits[:, kind == ch].any(axis=1)
+            for name, value in powerup["effect"].items():
+                self.player[name][got] = value
+            self.player[powerup["until"]][got] = now[got] + powerup["duration"]
+
+# -------------------- CLI --------------------
+
+def check(level, episodes, ticks, seed):
+    """Step Simulation and HeistVecEnv side by side with the same random
+    inputs; returns the number of mismatching ticks."""
+    env = HeistVecEnv(level, episodes)
+    rnd = random.Random(seed)
+    masks = np.array([[rnd.randrange(1 << 6) if rnd.random() < 0.1 else 0 for _ in range(episodes)]
+                      for _ in range(ticks)])
+    for t in range(1, ticks):  # hold inputs for a while, like a player
+        keep = masks[t] == 0
+        masks[t][keep] = masks[t - 1][keep]
+    masks &= ~(1 << INPUT_BITS.index("escape"))
+
+    sims = [Simulation(LEVELS[level - 1], env.settings) for _ in range(episodes)]
+    bad = 0
+    for t in range(ticks):
+        obs, _, term, trunc, info = env.step(masks[t])
+        for e, sim in enumerate(sims):
+            if sim.result is not None:
+                continue
+            sim.step(TickInput.from_mask(int(masks[t][e])))
+            vec_result = RESULTS[info["result"][e]]
+            if vec_result != sim.result:
+                bad += 1
+            elif sim.result is None:
+                same = (np.array(sim.player.pos) == env.pos[e]).all() and \
+                       np.array_equal(sim.guards.pos, env.gpos[e]) and sim.detect_meter == env.meter[e]
+                bad += not same
+            if sim.result is not None or term[e] or trunc[e]:
+                sims[e] = Simulation(LEVELS[level - 1], env.settings) if (term[e] or trunc[e]) else sim
+    return bad
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    ap.add_argument("--level", type=int, default=1, help=f"1..{len(LEVELS)}")
+    ap.add_argument("--difficulty", default="Medium", choices=list(DIFFICULTIES))
+    ap.add_argument("--envs", type=int, default=4096)
+    ap.add_argument("--steps", type=int, default=300)
+    ap.add_argument("--seed", type=int, default=0)
+    ap.add_argument("--check", type=int, metavar="N", help="compare N environments with Simulation instead")
+    args = ap.parse_args()
+
+    if args.check:
+        bad = check(args.level, args.check, args.steps, args.seed)
+        print(f"level {args.level}: {args.check} envs x {args.steps} ticks, {bad} mismatching env-ticks")
+        raise SystemExit(1 if bad else 0)
+
+    start = time.perf_counter()
+    env = HeistVecEnv(args.level, args.envs, args.difficulty)
+    built = time.perf_counter() - start
+    rng = np.random.default_rng(args.seed)
+    env.reset()
+    actions = rng.integers(0, 1 << 5, args.envs)  # movement + crouch
+    finished = 0
+    start = time.perf_counter()
+    for i in range(args.steps):
+        if i % 20 == 0:
+            actions = rng.integers(0, 1 << 5, args.envs)
+        _, _, term, trunc, _ = env.step(actions)
+        finished += int(term.sum() + trunc.sum())
+    elapsed = time.perf_counter() - start
+    print(f"level {args.level} x {args.envs} envs: {args.steps * args.envs / elapsed:,.0f} env-steps/s "
+          f"({elapsed / args.steps * 1000:.2f} ms per step, tables built in {built:.2f} s, "
+          f"{finished} episodes finished)")
+
+if __name__ == "__main__":
+    main()